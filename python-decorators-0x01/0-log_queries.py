@@ -1,23 +1,166 @@
 import sqlite3
 import functools
-from datetime import datetime
+import inspect
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import atexit
+import time
 
-def log_queries():
+# Query records are queued by the calling thread and written by a listener
+# thread, so a slow stdout never blocks the query path
+query_logger = logging.getLogger("query_log")
+query_logger.setLevel(logging.INFO)
+query_logger.propagate = False
+_listener = None
+
+
+class JSONFormatter(logging.Formatter):
     """
-    Decorator factory that logs the SQL query with a timestamp before executing the function.
+    Formats query records as one JSON object per line.
     """
+    FIELDS = ('query', 'duration_ms', 'rows', 'slow', 'error')
+
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record, '%Y-%m-%dT%H:%M:%S'),
+            'level': record.levelname,
+            'function': getattr(record, 'function', None),
+        }
+        for field in self.FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        return json.dumps(entry)
+
+
+class _RawQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that enqueues records untouched. Query records carry only
+    plain values, so formatting is left entirely to the listener thread.
+    """
+    def prepare(self, record):
+        return record
+
+
+def configure_query_logging(handler=None):
+    """
+    Route query_log records through a queue to handler (JSON lines on
+    stderr by default), written by a background listener thread.
+    Calling it again replaces the previous handler.
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+    if handler is None:
+        handler = logging.StreamHandler()
+        handler.setFormatter(JSONFormatter())
+
+    log_queue = queue.SimpleQueue()
+    for old_handler in list(query_logger.handlers):
+        query_logger.removeHandler(old_handler)
+    query_logger.addHandler(_RawQueueHandler(log_queue))
+    _listener = logging.handlers.QueueListener(log_queue, handler)
+    _listener.start()
+    return _listener
+
+
+def _stop_query_logging():
+    if _listener is not None:
+        _listener.stop()
+
+
+atexit.register(_stop_query_logging)
+
+
+def log_queries(sample_rate=1.0, slow_ms=100.0, logger=None):
+    """
+    Decorator factory that records each SQL query with its duration and
+    row count as a structured log record.
+
+    Args:
+        sample_rate (float): Fraction of ordinary queries to log (default 1.0).
+        slow_ms (float): Queries at least this slow are always logged, at
+            WARNING level (default 100 ms). Failed queries are always logged
+            at ERROR level.
+        logger (logging.Logger): Where records go (default query_log).
+
+    Coroutine functions are awaited and timed until they complete.
+    Records are only queued, so logging never blocks the event loop.
+    """
+    if not 0.0 <= sample_rate <= 1.0:
+        raise ValueError("sample_rate must be between 0 and 1")
+    slow_ns = int(slow_ms * 1_000_000)
+    if logger is None:
+        logger = query_logger
+        if _listener is None:
+            configure_query_logging()
+
+    def failed(func, args, kwargs, start, e):
+        duration_ns = time.perf_counter_ns() - start
+        logger.error("query failed", extra={
+            'function': func.__name__,
+            'query': _query_from(args, kwargs),
+            'duration_ms': duration_ns / 1_000_000,
+            'error': repr(e),
+        })
+
+    def completed(func, args, kwargs, start, result):
+        duration_ns = time.perf_counter_ns() - start
+
+        slow = duration_ns >= slow_ns
+        # Unsampled fast queries return before any record is built
+        if not slow and sample_rate < 1.0 and random.random() >= sample_rate:
+            return
+
+        logger.log(logging.WARNING if slow else logging.INFO, "query", extra={
+            'function': func.__name__,
+            'query': _query_from(args, kwargs),
+            'duration_ms': duration_ns / 1_000_000,
+            'rows': len(result) if isinstance(result, (list, tuple)) else None,
+            'slow': slow or None,
+        })
+
     def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                start = time.perf_counter_ns()
+                try:
+                    result = await func(*args, **kwargs)
+                except Exception as e:
+                    failed(func, args, kwargs, start, e)
+                    raise
+                completed(func, args, kwargs, start, result)
+                return result
+            return async_wrapper
+
         @functools.wraps(func)
         def wrapper(*args, **kwargs):
-            query = kwargs.get('query', None)
-            if query is None and len(args) > 0:
-                query = args[0]
-            current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            print(f"[{current_time}] Executing SQL query: {query}")
-            return func(*args, **kwargs)
+            start = time.perf_counter_ns()
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                failed(func, args, kwargs, start, e)
+                raise
+            completed(func, args, kwargs, start, result)
+            return result
         return wrapper
     return decorator
 
+
+def _query_from(args, kwargs):
+    """
+    Find the SQL string in the decorated function's arguments.
+    """
+    query = kwargs.get('query', None)
+    if query is None and len(args) > 0:
+        query = args[0]
+    return query
+
+
 @log_queries()
 def fetch_all_users(query):
     conn = sqlite3.connect('users.db')
@@ -27,5 +170,6 @@ def fetch_all_users(query):
     conn.close()
     return results
 
-# Fetch users while logging the query with timestamp
-users = fetch_all_users(query="SELECT * FROM users")
+if __name__ == "__main__":
+    # Fetch users while logging the query with its duration and row count
+    users = fetch_all_users(query="SELECT * FROM users")
@@ -1,24 +1,31 @@
-import sqlite3
 import functools
+import inspect
+
+import async_db
+import db_pool
 
 def with_db_connection(func):
     """
-    Decorator to automatically open a SQLite database connection,
-    pass the connection object as the first argument to the decorated function,
-    and ensure the connection is closed after the function completes,
-    even if an exception occurs.
+    Decorator to automatically borrow a SQLite database connection from the
+    shared users.db pool, pass the connection object as the first argument to
+    the decorated function, and ensure the connection is returned to the pool
+    after the function completes, even if an exception occurs.
+    Coroutine functions get an aiosqlite connection from the async pool
+    instead.
     """
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            async with async_db.get_pool('users.db').connection() as conn:
+                return await func(conn, *args, **kwargs)
+        return async_wrapper
+
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
-        # Open the database connection
-        conn = sqlite3.connect('users.db')
-        try:
+        # Borrow a pooled connection (reused if this thread already holds one)
+        with db_pool.get_pool('users.db').connection() as conn:
             # Pass the connection as the first argument to the decorated function
-            result = func(conn, *args, **kwargs)
-            return result
-        finally:
-            # Ensure the connection is closed regardless of success or error
-            conn.close()
+            return func(conn, *args, **kwargs)
     return wrapper
 
 @with_db_connection
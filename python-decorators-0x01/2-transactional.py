@@ -1,8 +1,15 @@
-import sqlite3
+import asyncio
 import functools
+import inspect
+import itertools
 import logging
 import time
 
+import async_db
+import db_pool
+import retry_policy
+import table_versions
+
 # Configure a logger for database operations
 logger = logging.getLogger("db_decorators")
 logger.setLevel(logging.DEBUG)  # Change as needed
@@ -13,52 +20,183 @@ logger.addHandler(handler)
 
 def with_db_connection(db_path='users.db'):
     """
-    Decorator factory to create a decorator that manages opening and closing
-    a database connection to the specified db_path.
+    Decorator factory to create a decorator that borrows a connection to the
+    specified db_path from its shared pool and returns it afterwards.
+    Coroutine functions borrow an aiosqlite connection from the async pool.
     """
     def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                async with async_db.get_pool(db_path).connection() as conn:
+                    logger.debug(f"Borrowed pooled async connection to {db_path}")
+                    try:
+                        return await func(conn, *args, **kwargs)
+                    finally:
+                        logger.debug(f"Returned async connection to {db_path}")
+            return async_wrapper
+
         @functools.wraps(func)
         def wrapper(*args, **kwargs):
-            conn = sqlite3.connect(db_path)
-            logger.debug(f"Opened connection to {db_path}")
-            try:
-                return func(conn, *args, **kwargs)
-            finally:
-                conn.close()
-                logger.debug(f"Closed connection to {db_path}")
+            with db_pool.get_pool(db_path).connection() as conn:
+                logger.debug(f"Borrowed pooled connection to {db_path}")
+                try:
+                    return func(conn, *args, **kwargs)
+                finally:
+                    logger.debug(f"Returned connection to {db_path}")
         return wrapper
     return decorator
 
-def transactional(retries=0, delay=1):
+# id() of every connection inside a transactional call right now; the pools
+# hand a thread or task the connection it already holds, so a nested call
+# must not commit the outer transaction
+_open_transactions = set()
+_savepoint_ids = itertools.count(1)
+
+def transactional(retries=0, delay=1, max_delay=30,
+                  retry_if=retry_policy.is_transient, budget=None):
     """
     Decorator factory to create a decorator that wraps a function in a database transaction.
     Automatically commits on success, rolls back on failure.
-    Supports optional retries on failure with delay between attempts.
+    Supports optional retries of transient failures with jittered exponential backoff.
+    Tables written by the transaction get their cache version bumped on
+    commit and on rollback, so cache_query drops results that read from
+    them, including any cached mid-transaction from uncommitted rows.
     
     Parameters:
     - retries (int): Number of times to retry on failure (default 0 = no retry)
-    - delay (int or float): Seconds to wait between retries
+    - delay (int or float): Base backoff in seconds; waits grow with decorrelated jitter
+    - max_delay (int or float): Upper bound for a single wait
+    - retry_if (callable): Decides whether an exception is worth retrying
+    - budget (RetryBudget): Token bucket shared across calls (default retry_policy.default_budget)
+
+    Coroutine functions are awaited on an aiosqlite connection, with async
+    commit/rollback and asyncio.sleep between retries.
+
+    A transactional call nested inside another on the same connection runs
+    in a SAVEPOINT instead: its failure rolls back only its own writes, and
+    its success is committed by the outermost call. Nested calls are never
+    retried on their own; the outermost call's retries rerun them.
     """
+    if budget is None:
+        budget = retry_policy.default_budget
+
+    def next_wait(e, attempts, wait):
+        """
+        Backoff before the next attempt, or None if e should be raised.
+        """
+        logger.error(f"Transaction failed and rolled back: {e}")
+        if not retry_if(e):
+            logger.error("Error is not transient. Raising exception.")
+            return None
+        if attempts > retries:
+            logger.error(f"Exceeded maximum retries ({retries}). Raising exception.")
+            return None
+        if not budget.try_spend():
+            logger.error("Retry budget exhausted. Raising exception.")
+            return None
+        wait = retry_policy.decorrelated_jitter(delay, max_delay, wait)
+        logger.info(f"Retrying transaction in {wait:.2f} seconds... (Attempt {attempts}/{retries})")
+        return wait
+
     def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(conn, *args, **kwargs):
+                if id(conn) in _open_transactions:
+                    return await nested_async(conn, *args, **kwargs)
+                _open_transactions.add(id(conn))
+                try:
+                    return await outermost_async(conn, *args, **kwargs)
+                finally:
+                    _open_transactions.discard(id(conn))
+
+            async def nested_async(conn, *args, **kwargs):
+                savepoint = f"transactional_{next(_savepoint_ids)}"
+                if not conn.in_transaction:
+                    # Otherwise RELEASE would commit the savepoint on its own
+                    await conn.execute("BEGIN")
+                await conn.execute(f"SAVEPOINT {savepoint}")
+                try:
+                    result = await func(conn, *args, **kwargs)
+                except BaseException:
+                    await conn.execute(f"ROLLBACK TO {savepoint}")
+                    await conn.execute(f"RELEASE {savepoint}")
+                    logger.debug(f"Nested transaction rolled back to {savepoint}.")
+                    raise
+                await conn.execute(f"RELEASE {savepoint}")
+                return result
+
+            async def outermost_async(conn, *args, **kwargs):
+                attempts = 0
+                wait = delay
+                while True:
+                    written = set()
+                    try:
+                        async with table_versions.track_writes_async(conn) as written:
+                            result = await func(conn, *args, **kwargs)
+                        await conn.commit()
+                        await table_versions.bump_async(written)
+                        logger.debug("Transaction committed successfully.")
+                        return result
+                    except Exception as e:
+                        await conn.rollback()
+                        # Results cached inside the transaction saw its writes
+                        await table_versions.bump_async(written)
+                        attempts += 1
+                        wait = next_wait(e, attempts, wait)
+                        if wait is None:
+                            raise
+                    await asyncio.sleep(wait)
+            return async_wrapper
+
         @functools.wraps(func)
         def wrapper(conn, *args, **kwargs):
+            if id(conn) in _open_transactions:
+                return nested(conn, *args, **kwargs)
+            _open_transactions.add(id(conn))
+            try:
+                return outermost(conn, *args, **kwargs)
+            finally:
+                _open_transactions.discard(id(conn))
+
+        def nested(conn, *args, **kwargs):
+            savepoint = f"transactional_{next(_savepoint_ids)}"
+            if not conn.in_transaction:
+                # Otherwise RELEASE would commit the savepoint on its own
+                conn.execute("BEGIN")
+            conn.execute(f"SAVEPOINT {savepoint}")
+            try:
+                result = func(conn, *args, **kwargs)
+            except BaseException:
+                conn.execute(f"ROLLBACK TO {savepoint}")
+                conn.execute(f"RELEASE {savepoint}")
+                logger.debug(f"Nested transaction rolled back to {savepoint}.")
+                raise
+            conn.execute(f"RELEASE {savepoint}")
+            return result
+
+        def outermost(conn, *args, **kwargs):
             attempts = 0
+            wait = delay
             while True:
+                written = set()
                 try:
-                    result = func(conn, *args, **kwargs)
+                    with table_versions.track_writes(conn) as written:
+                        result = func(conn, *args, **kwargs)
                     conn.commit()
+                    table_versions.bump(written)
                     logger.debug("Transaction committed successfully.")
                     return result
                 except Exception as e:
                     conn.rollback()
-                    logger.error(f"Transaction failed and rolled back: {e}")
+                    # Results cached inside the transaction saw its writes
+                    table_versions.bump(written)
                     attempts += 1
-                    if attempts > retries:
-                        logger.error(f"Exceeded maximum retries ({retries}). Raising exception.")
+                    wait = next_wait(e, attempts, wait)
+                    if wait is None:
                         raise
-                    else:
-                        logger.info(f"Retrying transaction in {delay} seconds... (Attempt {attempts}/{retries})")
-                        time.sleep(delay)
+                time.sleep(wait)
         return wrapper
     return decorator
 
@@ -1,45 +1,97 @@
 import time
-import sqlite3
+import asyncio
 import functools
+import inspect
+
+import async_db
+import db_pool
+import retry_policy
 
 def with_db_connection(func):
     """
-    Decorator to automatically open a SQLite database connection,
-    pass the connection object as the first argument to the decorated function,
-    and ensure the connection is closed after the function completes.
+    Borrows a pooled SQLite connection to users.db and returns it afterwards.
+    Passes connection as first argument to decorated function; coroutine
+    functions get an aiosqlite connection from the async pool.
     """
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            async with async_db.get_pool('users.db').connection() as conn:
+                return await func(conn, *args, **kwargs)
+        return async_wrapper
+
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
-        conn = sqlite3.connect('users.db')
-        try:
+        with db_pool.get_pool('users.db').connection() as conn:
             return func(conn, *args, **kwargs)
-        finally:
-            conn.close()
     return wrapper
 
-def retry_on_failure(retries=3, delay=2):
+def retry_on_failure(retries=3, delay=2, max_delay=30,
+                     retry_if=retry_policy.is_transient, budget=None):
     """
-    Decorator factory that retries the decorated function if it raises an exception.
+    Decorator factory that retries the decorated function if it raises a transient exception.
     
     Parameters:
     - retries (int): Number of retry attempts before giving up.
-    - delay (int or float): Seconds to wait between retries.
+    - delay (int or float): Base backoff in seconds; waits grow with decorrelated jitter.
+    - max_delay (int or float): Upper bound for a single wait.
+    - retry_if (callable): Decides whether an exception is worth retrying
+      (default: only lock contention, pool timeouts and connection errors).
+    - budget (RetryBudget): Token bucket shared across calls, so retries stop
+      once it is spent (default retry_policy.default_budget).
+
+    Coroutine functions are awaited and back off with asyncio.sleep, so a
+    retry never blocks the event loop.
     """
+    if budget is None:
+        budget = retry_policy.default_budget
+
+    def next_wait(func, e, attempts, wait):
+        """
+        Backoff before the next attempt, or None if e should be raised.
+        """
+        if not retry_if(e):
+            return None
+        if attempts > retries:
+            print(f"[ERROR] Function '{func.__name__}' failed after {retries} retries. Exception: {e}")
+            return None
+        if not budget.try_spend():
+            print(f"[ERROR] Function '{func.__name__}' failed and the retry budget is spent. Exception: {e}")
+            return None
+        wait = retry_policy.decorrelated_jitter(delay, max_delay, wait)
+        print(f"[WARNING] Function '{func.__name__}' failed with exception: {e}. Retrying {attempts}/{retries} after {wait:.2f} seconds...")
+        return wait
+
     def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                attempts = 0
+                wait = delay
+                while True:
+                    try:
+                        return await func(*args, **kwargs)
+                    except Exception as e:
+                        attempts += 1
+                        wait = next_wait(func, e, attempts, wait)
+                        if wait is None:
+                            raise
+                    await asyncio.sleep(wait)
+            return async_wrapper
+
         @functools.wraps(func)
         def wrapper(*args, **kwargs):
             attempts = 0
+            wait = delay
             while True:
                 try:
                     return func(*args, **kwargs)
                 except Exception as e:
                     attempts += 1
-                    if attempts > retries:
-                        print(f"[ERROR] Function '{func.__name__}' failed after {retries} retries. Exception: {e}")
+                    wait = next_wait(func, e, attempts, wait)
+                    if wait is None:
                         raise
-                    else:
-                        print(f"[WARNING] Function '{func.__name__}' failed with exception: {e}. Retrying {attempts}/{retries} after {delay} seconds...")
-                        time.sleep(delay)
+                time.sleep(wait)
         return wrapper
     return decorator
 
@@ -1,50 +1,321 @@
 import time
-import sqlite3
+import asyncio
 import functools
+import inspect
+import itertools
 import threading
+import weakref
 import hashlib
 import json
+import re
+import sys
+from collections import OrderedDict
 
-# Thread-safe cache dictionary storing tuples of (timestamp, result)
-query_cache = {}
+import async_db
+import db_pool
+import table_versions
+from cache_backends import CacheBackend
+
+
+class BoundedTTLCache(CacheBackend):
+    """
+    Thread-safe in-process LRU cache with per-entry expiry.
+
+    Holds at most max_entries results and at most max_bytes of estimated
+    result size, evicting the least recently used entries first. Expired
+    entries are dropped on lookup and by an amortised sweep every
+    sweep_interval writes, so keys that are never read again do not pile up.
+    Hit, miss, expiration, eviction and invalidation counters are available
+    from stats().
+    """
+    blocking = False
+
+    def __init__(self, max_entries=1024, max_bytes=64 * 1024 * 1024,
+                 sweep_interval=128, lock=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.sweep_interval = sweep_interval
+        self.lock = lock or threading.Lock()
+        self._entries = OrderedDict()  # key -> (expires_at, size, value)
+        self._bytes = 0
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def estimate_size(value, sample=16):
+        """
+        Approximate memory held by a cached result, in bytes: the object
+        plus its items, recursing through lists, tuples, sets and dicts.
+        Containers with more than sample items are extrapolated from an
+        evenly spaced sample, so the estimate costs about the same for ten
+        rows as for a million.
+        """
+        size = sys.getsizeof(value)
+        if isinstance(value, dict):
+            items = value.items()
+        elif isinstance(value, (list, tuple, set, frozenset)):
+            items = value
+        else:
+            return size
+        count = len(items)
+        if count == 0:
+            return size
+        if count <= sample:
+            picked = items
+        elif isinstance(value, (list, tuple)):
+            picked = [value[i * count // sample] for i in range(sample)]
+        else:
+            picked = list(itertools.islice(items, sample))
+        total = sum(BoundedTTLCache.estimate_size(item, sample)
+                    for item in picked)
+        return size + total * count // len(picked)
+
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def get(self, key, default=None, validate=None):
+        """
+        Return the cached value for key, or default if missing or expired.
+        If validate is given and validate(value) is false, the entry is
+        dropped as invalidated and default is returned.
+        """
+        with self.lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            if entry[0] <= time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return default
+            if validate is not None and not validate(entry[2]):
+                self._remove(key)
+                self.invalidations += 1
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+
+    def set(self, key, value, ttl, size=None):
+        """
+        Cache value under key for ttl seconds, evicting as needed.
+        size is the value's size in bytes if the caller knows it, otherwise
+        it is estimated. Values larger than the whole byte budget are not
+        cached.
+        """
+        if size is None:
+            size = self.estimate_size(value)
+        with self.lock:
+            if key in self._entries:
+                self._remove(key)
+            if size > self.max_bytes:
+                return
+            self._entries[key] = (time.monotonic() + ttl, size, value)
+            self._bytes += size
+            while (len(self._entries) > self.max_entries
+                   or self._bytes > self.max_bytes):
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+            self._writes += 1
+            if self._writes % self.sweep_interval == 0:
+                self._sweep_locked()
+
+    def delete(self, key):
+        """
+        Drop key from the cache if present.
+        """
+        with self.lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def _sweep_locked(self):
+        now = time.monotonic()
+        expired = [key for key, entry in self._entries.items()
+                   if entry[0] <= now]
+        for key in expired:
+            self._remove(key)
+        self.expirations += len(expired)
+        return len(expired)
+
+    def sweep(self):
+        """
+        Drop every expired entry now. Returns how many were dropped.
+        """
+        with self.lock:
+            return self._sweep_locked()
+
+    def clear(self):
+        """
+        Drop every entry and keep the counters.
+        """
+        with self.lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        """
+        Snapshot of the cache counters and current size, e.g. for metrics.
+        """
+        with self.lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'expirations': self.expirations,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
+
+
+# Thread-safe bounded cache of query results
 cache_lock = threading.Lock()
+query_cache = BoundedTTLCache(lock=cache_lock)
 
 def with_db_connection(func):
     """
-    Opens and closes SQLite connection automatically.
-    Passes connection as first argument to decorated function.
+    Borrows a pooled SQLite connection to users.db and returns it afterwards.
+    Passes connection as first argument to decorated function; coroutine
+    functions get an aiosqlite connection from the async pool.
     """
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            async with async_db.get_pool('users.db').connection() as conn:
+                return await func(conn, *args, **kwargs)
+        return async_wrapper
+
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
-        conn = sqlite3.connect('users.db')
-        try:
+        with db_pool.get_pool('users.db').connection() as conn:
             return func(conn, *args, **kwargs)
-        finally:
-            conn.close()
     return wrapper
 
+# Quoted string literals and identifiers, kept verbatim by normalize_query
+_QUOTED = re.compile(r"""('(?:[^']|'')*'|"(?:[^"]|"")*")""")
+
+
+@functools.lru_cache(maxsize=4096)
+def normalize_query(query):
+    """
+    Collapse runs of whitespace outside quoted literals to one space and
+    intern the result, so the same query written with different spacing
+    shares one cache key while 'a  b' and 'a b' stay distinct.
+    """
+    parts = _QUOTED.split(query)
+    # Odd parts are the quoted literals captured by the split
+    for index in range(0, len(parts), 2):
+        parts[index] = re.sub(r'\s+', ' ', parts[index])
+    return sys.intern("".join(parts).strip())
+
+
 def make_cache_key(query, params=None):
     """
-    Creates a unique cache key by hashing the JSON serialization of the query and params.
-    Ensures different queries or params generate different keys.
+    Creates a cache key from the normalised query and its params.
+    Each param is keyed together with its type, since SQLite can return
+    different results for 1, 1.0 and True (e.g. compared with a TEXT
+    column or selected back). Hashable params give a plain tuple key
+    without any serialisation. Unhashable params such as dicts fall back
+    to a SHA-256 digest of their JSON serialisation.
+    """
+    query = normalize_query(query)
+    if params is None:
+        params = ()
+    elif type(params) in (list, tuple):
+        params = tuple((type(param), param) for param in params)
+    else:
+        params = (type(params), params)
+    try:
+        hash(params)
+    except TypeError:
+        key_json = json.dumps(
+            {"query": query, "params": params}, sort_keys=True,
+            default=lambda value: (value.__qualname__
+                                   if isinstance(value, type) else repr(value))
+        )
+        return hashlib.sha256(key_json.encode('utf-8')).hexdigest()
+    return (query, params)
+
+_MISSING = object()
+
+
+def _in_transaction(args):
+    """
+    True if the connection passed as first argument has uncommitted
+    writes; such queries may see rows that are later rolled back, and a
+    cached result would hide the transaction's own writes, so they bypass
+    the cache.
+    """
+    return bool(args) and getattr(args[0], 'in_transaction', False) is True
+
+
+class _Flight:
     """
-    key_data = {
-        "query": query,
-        "params": params if params is not None else []
-    }
-    key_json = json.dumps(key_data, sort_keys=True)
-    return hashlib.sha256(key_json.encode('utf-8')).hexdigest()
-
-def cache_query(expiration=60):
+    One in-flight execution of a query that concurrent misses wait on.
+    """
+    def __init__(self):
+        self.done = threading.Event()
+        # Stays _MISSING if the leader was interrupted (KeyboardInterrupt,
+        # SystemExit) before producing a result or an error
+        self.result = _MISSING
+        self.error = None
+
+
+# cache key -> _Flight for queries currently being executed
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+# event loop -> {cache key: future} for coroutine queries being executed.
+# Only the loop's own thread touches its dict, so no lock is needed.
+_async_inflight = weakref.WeakKeyDictionary()
+
+
+def cache_query(expiration=60, cache=None, stale_ttl=0):
     """
     Decorator factory to cache database query results with expiration and parameter support.
 
     Args:
         expiration (int): Cache expiration time in seconds (default 60).
+        cache (CacheBackend): Cache to use (default the shared in-process
+            query_cache); pass a SQLiteCacheBackend to share results between
+            worker processes, and register it with table_versions.set_store
+            so writes in one worker invalidate results in all of them.
+        stale_ttl (int): Seconds past expiration during which a stale result
+            may still be served while one caller refreshes it (default 0).
+
+    Each result is tagged with the versions of the tables its query reads.
+    A commit through the transactional decorator that writes one of those
+    tables bumps its version, and the stale result is dropped on the next
+    lookup, so long expirations stay safe. Queries run on a connection
+    with an open write transaction bypass the cache.
+
+    Concurrent misses for the same key are coalesced: one caller runs the
+    query and the others wait for and share its result. With stale_ttl, the
+    waiting callers get the expired result right away instead.
+    Coroutine functions are coalesced per event loop on a shared future,
+    so waiting tasks never block the loop; if the running task is
+    cancelled, a waiting one takes over. Cache and table version lookups
+    that do I/O (SQLiteCacheBackend) run in a worker thread.
     """
+    if cache is None:
+        cache = query_cache
+
     def decorator(func):
-        @functools.wraps(func)
-        def wrapper(*args, **kwargs):
+        def lookup(args, kwargs):
+            """
+            Find the query and params in the call, and the cached entry
+            for them if any: (query, params, key, tables, entry).
+            """
             # Extract query and params from args or kwargs
             query = kwargs.get('query', None)
             params = kwargs.get('params', None)
@@ -60,25 +331,120 @@ def cache_query(expiration=60):
 
             cache_key = make_cache_key(query, params)
 
-            with cache_lock:
-                cache_entry = query_cache.get(cache_key)
-                if cache_entry:
-                    cached_time, result = cache_entry
-                    if (time.time() - cached_time) < expiration:
-                        print(f"[CACHE HIT] Returning cached result for query: {query} with params: {params}")
+            tables = table_versions.tables_read(query)
+
+            # Entries are (table versions, fresh until, result)
+            entry = cache.get(
+                cache_key, _MISSING,
+                validate=lambda entry: entry[0] == table_versions.snapshot(tables)
+            )
+            return query, params, cache_key, tables, entry
+
+        if inspect.iscoroutinefunction(func):
+            async def off_loop(function, *args):
+                # A SQLite backend or version store would block the loop
+                if cache.blocking or table_versions.store_blocks():
+                    return await asyncio.to_thread(function, *args)
+                return function(*args)
+
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                if _in_transaction(args):
+                    return await func(*args, **kwargs)
+                query, params, cache_key, tables, entry = await off_loop(
+                    lookup, args, kwargs
+                )
+                if entry is not _MISSING and entry[1] > time.time():
+                    print(f"[CACHE HIT] Returning cached result for query: {query} with params: {params}")
+                    return entry[2]
+
+                inflight = _async_inflight.setdefault(asyncio.get_running_loop(), {})
+                while True:
+                    flight = inflight.get(cache_key)
+                    if flight is None:
+                        break
+                    if entry is not _MISSING:
+                        print(f"[CACHE STALE] Returning stale result while refreshing query: {query} with params: {params}")
+                        return entry[2]
+                    # Shielded so a cancelled waiter does not cancel the leader's result
+                    result = await asyncio.shield(flight)
+                    if result is not _MISSING:
                         return result
-                    else:
-                        print(f"[CACHE EXPIRED] Cache expired for query: {query} with params: {params}")
-                        del query_cache[cache_key]
+                    # The leader was cancelled; the next waiter to wake runs the query
+
+                flight = inflight[cache_key] = asyncio.get_running_loop().create_future()
+                try:
+                    versions = await off_loop(table_versions.snapshot, tables)
+
+                    print(f"[CACHE MISS] Executing query: {query} with params: {params}")
+                    result = await func(*args, **kwargs)
+
+                    await off_loop(cache.set, cache_key,
+                                   (versions, time.time() + expiration, result),
+                                   expiration + stale_ttl)
+                    flight.set_result(result)
+                    return result
+                except Exception as e:
+                    flight.set_exception(e)
+                    # Mark it retrieved; the leader raises it either way
+                    flight.exception()
+                    raise
+                finally:
+                    del inflight[cache_key]
+                    if not flight.done():
+                        # Cancelled or interrupted: wake the waiters to retry
+                        flight.set_result(_MISSING)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _in_transaction(args):
+                return func(*args, **kwargs)
+            query, params, cache_key, tables, entry = lookup(args, kwargs)
+            if entry is not _MISSING and entry[1] > time.time():
+                print(f"[CACHE HIT] Returning cached result for query: {query} with params: {params}")
+                return entry[2]
+
+            while True:
+                with _inflight_lock:
+                    flight = _inflight.get(cache_key)
+                    leader = flight is None
+                    if leader:
+                        flight = _inflight[cache_key] = _Flight()
+                if leader:
+                    break
+
+                if entry is not _MISSING:
+                    print(f"[CACHE STALE] Returning stale result while refreshing query: {query} with params: {params}")
+                    return entry[2]
+                # Another caller is already running this query; share its result
+                flight.done.wait()
+                if flight.error is not None:
+                    raise flight.error
+                if flight.result is not _MISSING:
+                    return flight.result
+                # The leader was interrupted; run the query ourselves
 
-            # Cache miss or expired, execute the query
-            print(f"[CACHE MISS] Executing query: {query} with params: {params}")
-            result = func(*args, **kwargs)
+            try:
+                # Snapshot before running so a write racing the query marks it stale
+                versions = table_versions.snapshot(tables)
 
-            with cache_lock:
-                query_cache[cache_key] = (time.time(), result)
+                # Cache miss or expired, execute the query
+                print(f"[CACHE MISS] Executing query: {query} with params: {params}")
+                result = func(*args, **kwargs)
 
-            return result
+                cache.set(cache_key,
+                          (versions, time.time() + expiration, result),
+                          expiration + stale_ttl)
+                flight.result = result
+                return result
+            except Exception as e:
+                flight.error = e
+                raise
+            finally:
+                with _inflight_lock:
+                    del _inflight[cache_key]
+                flight.done.set()
         return wrapper
     return decorator
 
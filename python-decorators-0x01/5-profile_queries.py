@@ -0,0 +1,335 @@
+import re
+import math
+import json
+import time
+import functools
+import inspect
+import threading
+
+import async_db
+import db_pool
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+
+
+@functools.lru_cache(maxsize=4096)
+def normalize_sql(query):
+    """
+    Reduce a SQL string to its shape: literals become ?, IN lists collapse
+    to (?...) and whitespace is collapsed, so the same statement with
+    different values is profiled as one query.
+    """
+    query = _STRING_LITERAL.sub("?", query)
+    query = _NUMBER_LITERAL.sub("?", query)
+    query = _IN_LIST.sub("(?...)", query)
+    return " ".join(query.split())
+
+
+class LatencyHistogram:
+    """
+    HDR-style latency histogram in nanoseconds.
+
+    Values are counted in log-linear buckets: each power of two is split
+    into 2 ** (precision_bits - 1) equal buckets, so any reported percentile
+    is within about 2 ** -(precision_bits - 1) of the true value while the
+    histogram stays a few hundred counters at most.
+    """
+    def __init__(self, precision_bits=5):
+        self.precision_bits = precision_bits
+        self.counts = {}
+        self.count = 0
+        self.total_ns = 0
+        self.min_ns = None
+        self.max_ns = None
+
+    def _index(self, value):
+        bits = self.precision_bits
+        if value.bit_length() <= bits:
+            return value
+        shift = value.bit_length() - bits
+        half = 1 << (bits - 1)
+        return (1 << bits) + (shift - 1) * half + ((value >> shift) - half)
+
+    def _bounds(self, index):
+        bits = self.precision_bits
+        if index < (1 << bits):
+            return index, index
+        half = 1 << (bits - 1)
+        offset = index - (1 << bits)
+        shift = offset // half + 1
+        mantissa = offset % half + half
+        return mantissa << shift, ((mantissa + 1) << shift) - 1
+
+    def record(self, value_ns):
+        """
+        Count one latency sample.
+        """
+        value_ns = max(int(value_ns), 0)
+        index = self._index(value_ns)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.total_ns += value_ns
+        if self.min_ns is None or value_ns < self.min_ns:
+            self.min_ns = value_ns
+        if self.max_ns is None or value_ns > self.max_ns:
+            self.max_ns = value_ns
+
+    def percentile(self, fraction):
+        """
+        Latency at or below which fraction of samples fall, in nanoseconds.
+        """
+        if self.count == 0:
+            return None
+        target = max(1, math.ceil(self.count * fraction))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= target:
+                low, high = self._bounds(index)
+                return min(max((low + high) // 2, self.min_ns), self.max_ns)
+        return self.max_ns
+
+
+class QueryProfiler:
+    """
+    In-memory latency histograms and call counts per normalised SQL.
+    """
+    def __init__(self, precision_bits=5):
+        self.precision_bits = precision_bits
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def record(self, query, duration_ns):
+        """
+        Add one execution of query that took duration_ns.
+        """
+        key = normalize_sql(query)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = LatencyHistogram(
+                    self.precision_bits
+                )
+            histogram.record(duration_ns)
+
+    def snapshot(self):
+        """
+        Per-query statistics in milliseconds, hottest (most total time)
+        first.
+        """
+        def ms(value_ns):
+            return None if value_ns is None else value_ns / 1_000_000
+
+        with self._lock:
+            rows = [
+                {
+                    'query': query,
+                    'calls': histogram.count,
+                    'total_ms': ms(histogram.total_ns),
+                    'mean_ms': ms(histogram.total_ns / histogram.count),
+                    'min_ms': ms(histogram.min_ns),
+                    'p50_ms': ms(histogram.percentile(0.50)),
+                    'p95_ms': ms(histogram.percentile(0.95)),
+                    'p99_ms': ms(histogram.percentile(0.99)),
+                    'max_ms': ms(histogram.max_ns),
+                }
+                for query, histogram in self._histograms.items()
+            ]
+        return sorted(rows, key=lambda row: row['total_ms'], reverse=True)
+
+    def dump_json(self, path):
+        """
+        Write snapshot() to path as JSON.
+        """
+        with open(path, 'w') as output:
+            json.dump(self.snapshot(), output, indent=2)
+
+    def reset(self):
+        """
+        Forget every recorded query.
+        """
+        with self._lock:
+            self._histograms.clear()
+
+
+# Process-wide profiler used when profile_queries() gets none
+query_profiler = QueryProfiler()
+
+
+class _ProfiledCursor:
+    """
+    Cursor wrapper timing execute plus the fetches that read its rows.
+    A statement is recorded when the next one starts, the cursor closes
+    or the profiled call returns.
+    """
+    def __init__(self, cursor, profiler):
+        self._cursor = cursor
+        self._profiler = profiler
+        self._query = None
+        self._elapsed_ns = 0
+
+    def flush(self):
+        if self._query is not None:
+            self._profiler.record(self._query, self._elapsed_ns)
+            self._query = None
+            self._elapsed_ns = 0
+
+    def _timed(self, method, *args):
+        start = time.perf_counter_ns()
+        try:
+            return method(*args)
+        finally:
+            self._elapsed_ns += time.perf_counter_ns() - start
+
+    def execute(self, query, *args):
+        self.flush()
+        self._query = query
+        self._timed(self._cursor.execute, query, *args)
+        return self
+
+    def executemany(self, query, *args):
+        self.flush()
+        self._query = query
+        self._timed(self._cursor.executemany, query, *args)
+        return self
+
+    def executescript(self, script):
+        self.flush()
+        self._query = script
+        self._timed(self._cursor.executescript, script)
+        return self
+
+    def fetchone(self):
+        return self._timed(self._cursor.fetchone)
+
+    def fetchmany(self, *args):
+        return self._timed(self._cursor.fetchmany, *args)
+
+    def fetchall(self):
+        return self._timed(self._cursor.fetchall)
+
+    def close(self):
+        self.flush()
+        self._cursor.close()
+
+    # Iteration fetches row by row so lazy loops stay lazy and each
+    # step is timed
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        row = self.fetchone()
+        if row is None:
+            raise StopIteration
+        return row
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class _ProfiledConnection:
+    """
+    Connection wrapper handing out profiled cursors.
+    """
+    def __init__(self, conn, profiler):
+        self._conn = conn
+        self._profiler = profiler
+        self._cursors = []
+
+    def cursor(self, *args, **kwargs):
+        cursor = _ProfiledCursor(self._conn.cursor(*args, **kwargs),
+                                 self._profiler)
+        self._cursors.append(cursor)
+        return cursor
+
+    def execute(self, query, *args):
+        return self.cursor().execute(query, *args)
+
+    def executemany(self, query, *args):
+        return self.cursor().executemany(query, *args)
+
+    def executescript(self, script):
+        return self.cursor().executescript(script)
+
+    def flush(self):
+        for cursor in self._cursors:
+            cursor.flush()
+        self._cursors.clear()
+
+    # Special methods bypass __getattr__, so the transaction context
+    # manager (with conn: ...) is delegated explicitly
+    def __enter__(self):
+        self._conn.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        return self._conn.__exit__(*exc_info)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+def profile_queries(profiler=None):
+    """
+    Decorator factory that times every statement the decorated function
+    runs on the connection it receives as first argument, from
+    cursor.execute through the fetches of its rows, and records it in
+    profiler (default the shared query_profiler). Place it below
+    with_db_connection. Only synchronous sqlite3 connections can be
+    profiled; coroutine functions are rejected with TypeError.
+    """
+    if profiler is None:
+        profiler = query_profiler
+
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            raise TypeError(
+                f"profile_queries cannot profile coroutine function "
+                f"{func.__qualname__}"
+            )
+
+        @functools.wraps(func)
+        def wrapper(conn, *args, **kwargs):
+            profiled = _ProfiledConnection(conn, profiler)
+            try:
+                return func(profiled, *args, **kwargs)
+            finally:
+                profiled.flush()
+        return wrapper
+    return decorator
+
+
+def with_db_connection(func):
+    """
+    Borrows a pooled SQLite connection to users.db and returns it afterwards.
+    Passes connection as first argument to decorated function; coroutine
+    functions get an aiosqlite connection from the async pool.
+    """
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            async with async_db.get_pool('users.db').connection() as conn:
+                return await func(conn, *args, **kwargs)
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with db_pool.get_pool('users.db').connection() as conn:
+            return func(conn, *args, **kwargs)
+    return wrapper
+
+
+@with_db_connection
+@profile_queries()
+def fetch_users_older_than(conn, age):
+    cursor = conn.cursor()
+    cursor.execute("SELECT * FROM users WHERE age > ?", (age,))
+    return cursor.fetchall()
+
+
+if __name__ == "__main__":
+    for age in (20, 30, 40, 50):
+        fetch_users_older_than(age)
+    print(json.dumps(query_profiler.snapshot(), indent=2))
@@ -0,0 +1,248 @@
+import time
+import sqlite3
+import functools
+import inspect
+import threading
+from collections import deque
+
+import async_db
+import db_pool
+import retry_policy
+retry_on_failure = __import__('3-retry_on_failure').retry_on_failure
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+
+class CircuitOpenError(Exception):
+    """
+    Raised instead of calling the database while the circuit is open.
+    """
+
+
+# sqlite3 errors saying the database file itself is unusable. sqlite3 also
+# raises OperationalError for syntax errors and missing tables, which are
+# bugs in the call and must not open the circuit.
+OUTAGE_SQLITE_MESSAGES = (
+    'unable to open database',
+    'disk i/o error',
+    'database or disk is full',
+    'database disk image is malformed',
+    'file is not a database',
+)
+
+
+def is_outage(exc):
+    """
+    Return True for errors that say the database is unavailable rather than
+    that the call itself was wrong: the transient errors retry_policy
+    retries (lock contention, pool exhaustion, timeouts, lost connections)
+    and a missing, unreadable, full or corrupt database file.
+    """
+    if retry_policy.is_transient(exc):
+        return True
+    if isinstance(exc, sqlite3.DatabaseError):
+        message = str(exc).lower()
+        return any(text in message for text in OUTAGE_SQLITE_MESSAGES)
+    return False
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker for a database call path.
+
+    While closed, the outcome of the last window_size calls is kept; once
+    at least min_calls are recorded and the share of failures reaches
+    failure_rate, the circuit opens. While open every call fails at once
+    with CircuitOpenError. After open_seconds the circuit goes half-open
+    and lets up to half_open_calls trial calls through: if they all
+    succeed it closes again, and any failure reopens it.
+    Only exceptions for which is_failure returns True count as failures.
+    """
+    def __init__(self, name='users.db', failure_rate=0.5, window_size=20,
+                 min_calls=10, open_seconds=30.0, half_open_calls=1,
+                 is_failure=is_outage):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.open_seconds = open_seconds
+        self.half_open_calls = half_open_calls
+        self.is_failure = is_failure
+        self._window = deque(maxlen=window_size)
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._trials_started = 0
+        self._trials_succeeded = 0
+        self._lock = threading.Lock()
+        self.rejected = 0
+
+    @property
+    def state(self):
+        with self._lock:
+            self._refresh_locked()
+            return self._state
+
+    def _refresh_locked(self):
+        if (self._state == OPEN
+                and time.monotonic() - self._opened_at >= self.open_seconds):
+            self._state = HALF_OPEN
+            self._trials_started = 0
+            self._trials_succeeded = 0
+
+    def _open_locked(self):
+        self._state = OPEN
+        self._opened_at = time.monotonic()
+        self._window.clear()
+
+    def before_call(self):
+        """
+        Admit a call or raise CircuitOpenError.
+        """
+        with self._lock:
+            self._refresh_locked()
+            if self._state == OPEN or (
+                    self._state == HALF_OPEN
+                    and self._trials_started >= self.half_open_calls):
+                self.rejected += 1
+                retry_in = max(
+                    0.0, self._opened_at + self.open_seconds - time.monotonic()
+                )
+                raise CircuitOpenError(
+                    f"Circuit for {self.name} is {self._state}; "
+                    f"retry in {retry_in:.1f}s"
+                )
+            if self._state == HALF_OPEN:
+                self._trials_started += 1
+
+    def record(self, failed):
+        """
+        Record the outcome of an admitted call.
+        """
+        with self._lock:
+            if self._state == HALF_OPEN:
+                if failed:
+                    self._open_locked()
+                else:
+                    self._trials_succeeded += 1
+                    if self._trials_succeeded >= self.half_open_calls:
+                        self._state = CLOSED
+                        self._window.clear()
+                return
+            if self._state == OPEN:
+                # A call admitted before the circuit opened; nothing to learn
+                return
+
+            self._window.append(failed)
+            calls = len(self._window)
+            if (calls >= self.min_calls
+                    and sum(self._window) / calls >= self.failure_rate):
+                self._open_locked()
+
+    def cancel(self):
+        """
+        Forget an admitted call that ended without an outcome (cancelled or
+        interrupted); in half-open its trial slot is given back.
+        """
+        with self._lock:
+            if self._state == HALF_OPEN and self._trials_started > 0:
+                self._trials_started -= 1
+
+    def stats(self):
+        """
+        Current state, window contents and the number of rejected calls.
+        """
+        with self._lock:
+            self._refresh_locked()
+            return {
+                'state': self._state,
+                'window_calls': len(self._window),
+                'window_failures': sum(self._window),
+                'rejected': self.rejected,
+            }
+
+
+def circuit_breaker(breaker):
+    """
+    Decorator factory that guards a database call path with breaker.
+    Place it above with_db_connection so an open circuit fails fast
+    without even borrowing a connection. Coroutine functions are awaited
+    so their outcome, not the creation of the coroutine, is recorded.
+    A call cancelled or interrupted (CancelledError, KeyboardInterrupt)
+    records no outcome.
+    """
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                breaker.before_call()
+                try:
+                    result = await func(*args, **kwargs)
+                except Exception as e:
+                    breaker.record(breaker.is_failure(e))
+                    raise
+                except BaseException:
+                    # Cancellation and interrupts say nothing about the database
+                    breaker.cancel()
+                    raise
+                breaker.record(False)
+                return result
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            breaker.before_call()
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                breaker.record(breaker.is_failure(e))
+                raise
+            except BaseException:
+                # Cancellation and interrupts say nothing about the database
+                breaker.cancel()
+                raise
+            breaker.record(False)
+            return result
+        return wrapper
+    return decorator
+
+
+def with_db_connection(func):
+    """
+    Borrows a pooled SQLite connection to users.db and returns it afterwards.
+    Passes connection as first argument to decorated function; coroutine
+    functions get an aiosqlite connection from the async pool.
+    """
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            async with async_db.get_pool('users.db').connection() as conn:
+                return await func(conn, *args, **kwargs)
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with db_pool.get_pool('users.db').connection() as conn:
+            return func(conn, *args, **kwargs)
+    return wrapper
+
+
+users_db_breaker = CircuitBreaker('users.db')
+
+
+@circuit_breaker(users_db_breaker)
+@with_db_connection
+@retry_on_failure(retries=2, delay=0.5)
+def fetch_users_guarded(conn):
+    cursor = conn.cursor()
+    cursor.execute("SELECT * FROM users")
+    return cursor.fetchall()
+
+
+if __name__ == "__main__":
+    try:
+        users = fetch_users_guarded()
+        print(f"Fetched {len(users)} users")
+    except CircuitOpenError as e:
+        print(f"Database unavailable: {e}")
+    print(users_db_breaker.stats())
@@ -0,0 +1,146 @@
+import asyncio
+import os
+import sqlite3
+import weakref
+from contextlib import asynccontextmanager
+
+try:
+    import aiosqlite
+except ImportError:  # aiosqlite is only needed by the async decorator paths
+    aiosqlite = None
+
+from db_pool import DEFAULT_PRAGMAS, PoolTimeout
+
+
+class AsyncSQLiteConnectionPool:
+    """
+    Bounded pool of aiosqlite connections to one database file, the async
+    counterpart of db_pool.SQLiteConnectionPool.
+
+    At most max_size connections exist at once; tasks beyond that wait up
+    to timeout seconds. A task that already holds a connection gets the
+    same one back for nested borrows, so stacked decorators share it.
+    On return any open transaction is rolled back and per-call state
+    (row_factory, trace callback) is reset.
+    A pool belongs to the event loop it was created on.
+    """
+    def __init__(self, db_path='users.db', max_size=8,
+                 pragmas=DEFAULT_PRAGMAS, timeout=5.0):
+        if aiosqlite is None:
+            raise ImportError("async database access requires aiosqlite")
+        if max_size < 1:
+            raise ValueError("max_size must be at least 1")
+        self.db_path = db_path
+        self.max_size = max_size
+        self.pragmas = pragmas
+        self.timeout = timeout
+        self._idle = []
+        self._slots = asyncio.Semaphore(max_size)
+        self._held = weakref.WeakKeyDictionary()  # task -> [conn, depth]
+
+    async def _connect(self):
+        conn = await aiosqlite.connect(self.db_path)
+        for name, value in self.pragmas:
+            await conn.execute(f"PRAGMA {name}={value}")
+        return conn
+
+    async def acquire(self):
+        """
+        Borrow a connection; pair every call with release().
+        """
+        task = asyncio.current_task()
+        held = self._held.get(task)
+        if held is not None:
+            held[1] += 1
+            return held[0]
+
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.timeout)
+        except asyncio.TimeoutError:
+            raise PoolTimeout(
+                f"No connection to {self.db_path} free after "
+                f"{self.timeout}s (max_size={self.max_size})"
+            ) from None
+        try:
+            conn = self._idle.pop() if self._idle else await self._connect()
+        except BaseException:
+            self._slots.release()
+            raise
+
+        self._held[task] = [conn, 1]
+        return conn
+
+    async def release(self, conn):
+        """
+        Return a connection borrowed with acquire().
+        """
+        task = asyncio.current_task()
+        held = self._held.get(task)
+        if held is None or held[0] is not conn:
+            raise ValueError("Connection was not borrowed by this task")
+        if held[1] > 1:
+            held[1] -= 1
+            return
+        del self._held[task]
+
+        try:
+            if conn.in_transaction:
+                await conn.rollback()
+            conn.row_factory = None
+            await conn.set_trace_callback(None)
+        except sqlite3.Error:
+            # A broken connection is dropped instead of going back to the pool
+            await conn.close()
+        else:
+            self._idle.append(conn)
+        finally:
+            self._slots.release()
+
+    @asynccontextmanager
+    async def connection(self):
+        """
+        Async context manager that borrows a connection and always
+        returns it.
+        """
+        conn = await self.acquire()
+        try:
+            yield conn
+        finally:
+            await self.release(conn)
+
+    async def close(self):
+        """
+        Close every idle connection.
+        """
+        idle, self._idle = self._idle, []
+        for conn in idle:
+            await conn.close()
+
+
+# event loop -> {db_path: pool}; a pool's semaphore cannot cross loops
+_pools = weakref.WeakKeyDictionary()
+
+
+def get_pool(db_path='users.db'):
+    """
+    Return the async pool for db_path on the running event loop, creating
+    it with max_size from DB_POOL_MAX_SIZE (default 8) on first use.
+    """
+    loop = asyncio.get_running_loop()
+    pools = _pools.setdefault(loop, {})
+    pool = pools.get(db_path)
+    if pool is None:
+        pool = pools[db_path] = AsyncSQLiteConnectionPool(
+            db_path, max_size=int(os.environ.get('DB_POOL_MAX_SIZE', '8'))
+        )
+    return pool
+
+
+async def close_pools():
+    """
+    Close the idle connections of every pool on the running event loop;
+    call it before the loop shuts down.
+    """
+    pools = _pools.pop(asyncio.get_running_loop(), {})
+    for pool in pools.values():
+        await pool.close()
@@ -0,0 +1,267 @@
+import hashlib
+import json
+import os
+import pickle
+import sqlite3
+import struct
+import threading
+import time
+
+
+class CacheBackend:
+    """
+    Interface every cache_query backend implements.
+    Keys are the values returned by make_cache_key; values are any
+    picklable query result.
+    """
+    # True if get/set do I/O, so async callers run them off the event loop
+    blocking = True
+
+    def get(self, key, default=None, validate=None):
+        """
+        Return the cached value for key, or default if missing or expired.
+        If validate is given and validate(value) is false, the entry is
+        dropped as invalidated and default is returned.
+        """
+        raise NotImplementedError
+
+    def set(self, key, value, ttl):
+        """
+        Cache value under key for ttl seconds.
+        """
+        raise NotImplementedError
+
+    def delete(self, key):
+        """
+        Drop key from the cache if present.
+        """
+        raise NotImplementedError
+
+    def clear(self):
+        """
+        Drop every entry.
+        """
+        raise NotImplementedError
+
+    def stats(self):
+        """
+        Snapshot of the backend counters.
+        """
+        raise NotImplementedError
+
+
+def dumps(value):
+    """
+    Serialise value with pickle protocol 5. Large binary buffers (bytes-like
+    objects supporting out-of-band pickling, e.g. NumPy arrays) are written
+    after the pickle stream instead of being copied into it.
+    """
+    buffers = []
+    payload = pickle.dumps(value, protocol=5, buffer_callback=buffers.append)
+    parts = [struct.pack('<I', len(buffers))]
+    for buffer in buffers:
+        raw = buffer.raw()
+        parts.append(struct.pack('<Q', raw.nbytes))
+        parts.append(raw)
+    parts.append(payload)
+    return b''.join(parts)
+
+
+def loads(data):
+    """
+    Inverse of dumps. Out-of-band buffers are handed to pickle as
+    zero-copy views of data.
+    """
+    view = memoryview(data)
+    (count,) = struct.unpack_from('<I', view, 0)
+    offset = 4
+    buffers = []
+    for _ in range(count):
+        (size,) = struct.unpack_from('<Q', view, offset)
+        offset += 8
+        buffers.append(view[offset:offset + size])
+        offset += size
+    return pickle.loads(view[offset:], buffers=buffers)
+
+
+def _canonical(value):
+    """
+    JSON-ready form of a cache key made of (type name, value) pairs.
+    Unlike pickle, whose output depends on object identity through its
+    memo, equal keys always give equal encodings.
+    """
+    if isinstance(value, type):
+        return ['type', f"{value.__module__}.{value.__qualname__}"]
+    if isinstance(value, (tuple, list)):
+        return [type(value).__name__, [_canonical(item) for item in value]]
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return [type(value).__name__, value]
+    return [type(value).__qualname__, repr(value)]
+
+
+class SQLiteCacheBackend(CacheBackend):
+    """
+    Cache shared by every process on a host through one SQLite file in WAL
+    mode, so gunicorn workers warm and read a single copy.
+
+    Holds at most max_entries results; an amortised sweep every
+    sweep_interval writes removes expired rows and then the rows closest to
+    expiry. The backend is also a table version store: after
+    table_versions.set_store(backend) the per-table versions used by
+    cache_query invalidation are kept in the same file, so a write
+    committed in one worker invalidates results cached by all of them.
+    Counters from stats() are per process.
+    """
+    def __init__(self, path='query_cache.db', max_entries=100000,
+                 sweep_interval=256):
+        self.path = path
+        self.max_entries = max_entries
+        self.sweep_interval = sweep_interval
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+        conn = self._connection()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache_entries ("
+            "key TEXT PRIMARY KEY, expires_at REAL NOT NULL, "
+            "value BLOB NOT NULL)"
+        )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_cache_expires "
+            "ON cache_entries (expires_at)"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS table_versions ("
+            "name TEXT PRIMARY KEY, version INTEGER NOT NULL)"
+        )
+
+    def _connection(self):
+        """
+        Per-thread connection, reopened after a fork.
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5,
+                                   isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @staticmethod
+    def _key(key):
+        """
+        Stable text form of a make_cache_key key, identical in every process
+        and for every pair of equal keys.
+        """
+        if isinstance(key, str):
+            return key
+        encoded = json.dumps(_canonical(key), separators=(',', ':'))
+        return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+    def _count(self, counter):
+        with self._stats_lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def get(self, key, default=None, validate=None):
+        db_key = self._key(key)
+        conn = self._connection()
+        row = conn.execute(
+            "SELECT expires_at, value FROM cache_entries WHERE key = ?",
+            (db_key,)
+        ).fetchone()
+        if row is None:
+            self._count('misses')
+            return default
+        if row[0] <= time.time():
+            conn.execute("DELETE FROM cache_entries WHERE key = ?", (db_key,))
+            self._count('expirations')
+            self._count('misses')
+            return default
+        value = loads(row[1])
+        if validate is not None and not validate(value):
+            conn.execute("DELETE FROM cache_entries WHERE key = ?", (db_key,))
+            self._count('invalidations')
+            self._count('misses')
+            return default
+        self._count('hits')
+        return value
+
+    def set(self, key, value, ttl):
+        conn = self._connection()
+        conn.execute(
+            "INSERT OR REPLACE INTO cache_entries (key, expires_at, value) "
+            "VALUES (?, ?, ?)",
+            (self._key(key), time.time() + ttl, dumps(value))
+        )
+        with self._stats_lock:
+            self._writes += 1
+            sweep = self._writes % self.sweep_interval == 0
+        if sweep:
+            self.sweep()
+
+    def delete(self, key):
+        self._connection().execute(
+            "DELETE FROM cache_entries WHERE key = ?", (self._key(key),)
+        )
+
+    def sweep(self):
+        """
+        Remove expired rows, then trim to max_entries by dropping the rows
+        closest to expiry. Returns how many rows were removed.
+        """
+        conn = self._connection()
+        removed = conn.execute(
+            "DELETE FROM cache_entries WHERE expires_at <= ?", (time.time(),)
+        ).rowcount
+        removed += conn.execute(
+            "DELETE FROM cache_entries WHERE key IN ("
+            "SELECT key FROM cache_entries ORDER BY expires_at DESC "
+            "LIMIT -1 OFFSET ?)",
+            (self.max_entries,)
+        ).rowcount
+        return removed
+
+    def clear(self):
+        self._connection().execute("DELETE FROM cache_entries")
+
+    def __len__(self):
+        return self._connection().execute(
+            "SELECT COUNT(*) FROM cache_entries").fetchone()[0]
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                'entries': len(self),
+                'hits': self.hits,
+                'misses': self.misses,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations,
+            }
+
+    # Table version store used by table_versions.set_store
+
+    def snapshot(self, tables):
+        if not tables:
+            return ()
+        placeholders = ", ".join("?" for _ in tables)
+        versions = dict(self._connection().execute(
+            f"SELECT name, version FROM table_versions "
+            f"WHERE name IN ({placeholders})",
+            tuple(tables)
+        ).fetchall())
+        return tuple(versions.get(table, 0) for table in tables)
+
+    def bump(self, tables):
+        conn = self._connection()
+        conn.executemany(
+            "INSERT INTO table_versions (name, version) VALUES (?, 1) "
+            "ON CONFLICT(name) DO UPDATE SET version = version + 1",
+            [(table,) for table in tables]
+        )
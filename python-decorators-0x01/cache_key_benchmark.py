@@ -0,0 +1,57 @@
+import hashlib
+import json
+import timeit
+
+cache_query = __import__('4-cache_query')
+
+QUERY = "SELECT * FROM users WHERE id > ?"
+PARAMS = (0,)
+
+
+def legacy_make_cache_key(query, params=None):
+    """
+    The previous key function: SHA-256 of the JSON-serialised query and params.
+    """
+    key_data = {
+        "query": query,
+        "params": params if params is not None else []
+    }
+    key_json = json.dumps(key_data, sort_keys=True)
+    return hashlib.sha256(key_json.encode('utf-8')).hexdigest()
+
+
+def per_call_ns(statement, number=200000, repeat=5):
+    """
+    Best-of-repeat time of one call to statement, in nanoseconds.
+    """
+    best = min(timeit.repeat(statement, number=number, repeat=repeat))
+    return best / number * 1e9
+
+
+def run_benchmark():
+    """
+    Compare key generation and the cost of a full cache-hit lookup
+    (key + cache get) with the legacy and the current key function.
+    """
+    cache = cache_query.BoundedTTLCache()
+    legacy_key = legacy_make_cache_key(QUERY, PARAMS)
+    current_key = cache_query.make_cache_key(QUERY, PARAMS)
+    cache.set(legacy_key, [(1, 'user')], 3600)
+    cache.set(current_key, [(1, 'user')], 3600)
+
+    cases = {
+        'legacy key': lambda: legacy_make_cache_key(QUERY, PARAMS),
+        'tuple key': lambda: cache_query.make_cache_key(QUERY, PARAMS),
+        'hashed fallback key': lambda: cache_query.make_cache_key(
+            QUERY, {'id': 0}),
+        'legacy key + hit': lambda: cache.get(
+            legacy_make_cache_key(QUERY, PARAMS)),
+        'tuple key + hit': lambda: cache.get(
+            cache_query.make_cache_key(QUERY, PARAMS)),
+    }
+    for name, statement in cases.items():
+        print(f"{name:<22}{per_call_ns(statement):>10.0f} ns/call")
+
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -0,0 +1,179 @@
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+# Applied to every new connection before it is handed out
+DEFAULT_PRAGMAS = (
+    ("journal_mode", "WAL"),
+    ("synchronous", "NORMAL"),
+    ("cache_size", "-16000"),  # negative means KiB, so about 16 MB
+    ("temp_store", "MEMORY"),
+)
+
+
+class PoolTimeout(Exception):
+    """
+    Raised when no pooled connection became free in time.
+    """
+
+
+class SQLiteConnectionPool:
+    """
+    Bounded pool of SQLite connections to one database file.
+
+    At most max_size connections exist at once; callers beyond that wait up
+    to timeout seconds. A thread that already holds a connection gets the
+    same one back for nested borrows, and idle connections are reused
+    last-in first-out so a busy thread keeps hitting a warm connection.
+    On return any open transaction is rolled back and per-call state
+    (row_factory, trace callback) is reset.
+    """
+    def __init__(self, db_path='users.db', max_size=8, min_size=1,
+                 pragmas=DEFAULT_PRAGMAS, timeout=5.0):
+        if max_size < 1:
+            raise ValueError("max_size must be at least 1")
+        self.db_path = db_path
+        self.max_size = max_size
+        self.pragmas = pragmas
+        self.timeout = timeout
+        self._idle = []
+        self._size = 0
+        self._available = threading.Condition(threading.Lock())
+        self._local = threading.local()
+        self.prewarm(min(min_size, max_size))
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        for name, value in self.pragmas:
+            conn.execute(f"PRAGMA {name}={value}")
+        return conn
+
+    def prewarm(self, count):
+        """
+        Open idle connections until at least count exist.
+        """
+        with self._available:
+            while self._size < count:
+                self._idle.append(self._connect())
+                self._size += 1
+                self._available.notify()
+
+    def acquire(self):
+        """
+        Borrow a connection; pair every call with release().
+        """
+        held = getattr(self._local, 'held', None)
+        if held is not None:
+            conn, depth = held
+            self._local.held = (conn, depth + 1)
+            return conn
+
+        with self._available:
+            while not self._idle and self._size >= self.max_size:
+                if not self._available.wait(self.timeout):
+                    raise PoolTimeout(
+                        f"No connection to {self.db_path} free after "
+                        f"{self.timeout}s (max_size={self.max_size})"
+                    )
+            if self._idle:
+                conn = self._idle.pop()
+            else:
+                self._size += 1
+                conn = None
+        if conn is None:
+            try:
+                conn = self._connect()
+            except Exception:
+                with self._available:
+                    self._size -= 1
+                    self._available.notify()
+                raise
+
+        self._local.held = (conn, 1)
+        return conn
+
+    def release(self, conn):
+        """
+        Return a connection borrowed with acquire().
+        """
+        held_conn, depth = getattr(self._local, 'held', None) or (None, 0)
+        if held_conn is not conn:
+            raise ValueError("Connection was not borrowed by this thread")
+        if depth > 1:
+            self._local.held = (conn, depth - 1)
+            return
+        self._local.held = None
+
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            conn.row_factory = None
+            conn.set_trace_callback(None)
+        except sqlite3.Error:
+            # A broken connection is dropped instead of going back to the pool
+            conn.close()
+            with self._available:
+                self._size -= 1
+                self._available.notify()
+            return
+
+        with self._available:
+            self._idle.append(conn)
+            self._available.notify()
+
+    @contextmanager
+    def connection(self):
+        """
+        Context manager that borrows a connection and always returns it.
+        """
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close(self):
+        """
+        Close every idle connection. Connections still borrowed are closed
+        by the garbage collector once the pool is no longer referenced.
+        """
+        with self._available:
+            for conn in self._idle:
+                conn.close()
+            self._size -= len(self._idle)
+            self._idle.clear()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def configure_pool(db_path='users.db', **options):
+    """
+    Create (or replace) the shared pool for db_path with the given
+    SQLiteConnectionPool options, e.g. max_size or pragmas.
+    """
+    pool = SQLiteConnectionPool(db_path, **options)
+    with _pools_lock:
+        previous = _pools.get(db_path)
+        _pools[db_path] = (os.getpid(), pool)
+    if previous is not None and previous[0] == os.getpid():
+        previous[1].close()
+    return pool
+
+
+def get_pool(db_path='users.db'):
+    """
+    Return the shared pool for db_path, creating it with default options
+    (max_size from DB_POOL_MAX_SIZE, default 8) on first use. Pools
+    inherited through fork are not reused by the child process.
+    """
+    with _pools_lock:
+        entry = _pools.get(db_path)
+        if entry is None or entry[0] != os.getpid():
+            pool = SQLiteConnectionPool(
+                db_path, max_size=int(os.environ.get('DB_POOL_MAX_SIZE', '8'))
+            )
+            entry = _pools[db_path] = (os.getpid(), pool)
+        return entry[1]
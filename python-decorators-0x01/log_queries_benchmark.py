@@ -0,0 +1,39 @@
+import logging
+import timeit
+
+log_queries = __import__('0-log_queries')
+
+QUERY = "SELECT * FROM users"
+RESULT = [(1, 'user')]
+
+
+def per_call_ns(func, number=200000, repeat=5):
+    """
+    Best-of-repeat time of one func(QUERY) call, in nanoseconds.
+    """
+    best = min(timeit.repeat(lambda: func(QUERY), number=number,
+                             repeat=repeat))
+    return best / number * 1e9
+
+
+def run_benchmark():
+    """
+    Measure what log_queries adds to a call that does no real work, at
+    several sample rates. Records go to a NullHandler on the listener
+    thread, so only the cost paid by the calling thread is measured.
+    """
+    log_queries.configure_query_logging(logging.NullHandler())
+
+    def fetch(query):
+        return RESULT
+
+    baseline = per_call_ns(fetch)
+    print(f"{'undecorated':<20}{baseline:>10.0f} ns/call")
+    for rate in (0.0, 0.01, 0.1, 1.0):
+        decorated = log_queries.log_queries(sample_rate=rate)(fetch)
+        overhead = per_call_ns(decorated, number=50000) - baseline
+        print(f"{f'sample_rate={rate}':<20}{overhead:>10.0f} ns overhead")
+
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -0,0 +1,71 @@
+import random
+import sqlite3
+import threading
+import time
+
+import db_pool
+
+# sqlite3.OperationalError messages that describe a passing condition
+TRANSIENT_SQLITE_MESSAGES = (
+    'database is locked',
+    'database table is locked',
+    'database schema has changed',
+)
+
+
+def is_transient(exc):
+    """
+    Return True for errors worth retrying: lock contention in SQLite, an
+    exhausted connection pool, timeouts and dropped connections.
+    Programming errors such as a bad query or wrong arguments are never
+    retried.
+    """
+    if isinstance(exc, sqlite3.OperationalError):
+        message = str(exc).lower()
+        return any(text in message for text in TRANSIENT_SQLITE_MESSAGES)
+    return isinstance(exc, (db_pool.PoolTimeout, TimeoutError,
+                            ConnectionError))
+
+
+def decorrelated_jitter(base, cap, previous):
+    """
+    Next backoff delay using decorrelated jitter: a random value between
+    base and three times the previous delay, capped at cap. Clients that
+    failed together drift apart instead of retrying in lockstep.
+    """
+    return min(cap, random.uniform(base, max(base, previous * 3)))
+
+
+class RetryBudget:
+    """
+    Token bucket shared by every call that uses it. Each retry spends one
+    token and tokens refill at refill_per_second up to capacity, so during
+    an outage retries are capped at that rate across all callers instead of
+    multiplying the load on the database.
+    """
+    def __init__(self, capacity=10, refill_per_second=1.0):
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def try_spend(self):
+        """
+        Take one token if available. Returns False when the budget is spent.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.capacity,
+                self._tokens + (now - self._updated) * self.refill_per_second
+            )
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+
+# Budget shared by retry_on_failure and transactional unless one is passed
+default_budget = RetryBudget()
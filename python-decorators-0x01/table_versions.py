@@ -0,0 +1,234 @@
+import asyncio
+import re
+import threading
+import functools
+from contextlib import asynccontextmanager, contextmanager
+
+# Per-table version counters, bumped whenever a committed write touches them
+_versions = {}
+_versions_lock = threading.Lock()
+
+# Pseudo-tables for statements that cannot be parsed with confidence:
+# ANY_WRITE is bumped by every write, and a read whose tables are uncertain
+# depends on it; UNKNOWN_WRITE is bumped by a write whose table is
+# uncertain, and every snapshot depends on it.
+ANY_WRITE = '*'
+UNKNOWN_WRITE = '?'
+
+_NAME = r'(?:"[^"]+"|`[^`]+`|\[[^\]]+\]|\w+)'
+_QUALIFIED_NAME = rf'(?:{_NAME}\s*\.\s*)?({_NAME})'
+_LITERALS_AND_COMMENTS = re.compile(
+    r"'(?:[^']|'')*'|--[^\n]*|/\*.*?\*/", re.DOTALL
+)
+_FROM_OR_JOIN = re.compile(r'\b(FROM|JOIN)\b', re.IGNORECASE)
+_ALIAS_PATTERN = (
+    r'(?:\s+(?:AS\s+)?(?!(?:WHERE|JOIN|INNER|LEFT|RIGHT|FULL|OUTER|CROSS'
+    r'|NATURAL|ON|USING|GROUP|ORDER|HAVING|LIMIT|UNION|EXCEPT|INTERSECT'
+    r'|WINDOW|INDEXED|NOT)\b)\w+)?\s*'
+)
+_TABLE_REF = re.compile(rf'\s*{_QUALIFIED_NAME}' + _ALIAS_PATTERN,
+                        re.IGNORECASE)
+_ALIAS = re.compile(_ALIAS_PATTERN, re.IGNORECASE)
+_WRITE_TABLES = re.compile(
+    r'\s*(?:INSERT\s+(?:OR\s+\w+\s+)?INTO|REPLACE\s+INTO'
+    rf'|UPDATE(?:\s+OR\s+\w+)?|DELETE\s+FROM)\s+{_QUALIFIED_NAME}',
+    re.IGNORECASE
+)
+_READ_ONLY_STATEMENT = re.compile(
+    r'\s*(?:SELECT|VALUES|BEGIN|COMMIT|END|ROLLBACK|SAVEPOINT|RELEASE'
+    r'|PRAGMA|EXPLAIN|ANALYZE|VACUUM)\b|\s*$',
+    re.IGNORECASE
+)
+_WRITE_KEYWORD = re.compile(r'\b(?:INSERT|UPDATE|DELETE|REPLACE)\b',
+                            re.IGNORECASE)
+
+
+def _skip_parenthesised(query, start):
+    """
+    Index just past the parenthesis matching the one at start, or None.
+    """
+    depth = 0
+    for position in range(start, len(query)):
+        if query[position] == '(':
+            depth += 1
+        elif query[position] == ')':
+            depth -= 1
+            if depth == 0:
+                return position + 1
+    return None
+
+
+def _strip_literals(query):
+    return _LITERALS_AND_COMMENTS.sub(" ", query)
+
+
+def _table_name(name):
+    if name[0] in '"`[':
+        name = name[1:-1]
+    return name.lower()
+
+
+@functools.lru_cache(maxsize=1024)
+def tables_read(query):
+    """
+    Return the lower-cased names of the tables a SELECT reads from,
+    as a sorted tuple. Comma-separated FROM lists, joins and subqueries
+    are followed and schema prefixes dropped. When a FROM or JOIN cannot
+    be parsed, ANY_WRITE is included so any write invalidates the result.
+    """
+    query = _strip_literals(query)
+    tables = set()
+    uncertain = False
+    for keyword in _FROM_OR_JOIN.finditer(query):
+        position = keyword.end()
+        while True:
+            match = _TABLE_REF.match(query, position)
+            if match is not None and query[match.end():match.end() + 1] != '(':
+                tables.add(_table_name(match.group(1)))
+            else:
+                # A subquery (its own FROM is parsed in turn) or a
+                # table-valued function such as json_each(...): skip it
+                opening = match.end() if match else (
+                    len(query) - len(query[position:].lstrip())
+                )
+                closing = None
+                if query[opening:opening + 1] == '(':
+                    closing = _skip_parenthesised(query, opening)
+                match = _ALIAS.match(query, closing) if closing else None
+                if match is None:
+                    uncertain = True
+                    break
+            position = match.end()
+            if keyword.group(1).upper() != 'FROM' or query[position:position + 1] != ',':
+                break
+            position += 1
+    if uncertain:
+        tables.add(ANY_WRITE)
+    return tuple(sorted(tables))
+
+
+def tables_written(query):
+    """
+    Return the lower-cased name of the table an INSERT, UPDATE, DELETE or
+    REPLACE statement writes to, without any schema prefix, or None for
+    statements that do not write (SELECT, transaction control, ...).
+    Statements that may write somewhere unknown (DDL, CTEs with writes,
+    trigger bodies) return UNKNOWN_WRITE.
+    """
+    if query.lstrip().startswith('-- TRIGGER'):
+        # sqlite3 traces each trigger program; what it writes is unknown
+        return UNKNOWN_WRITE
+    query = _strip_literals(query)
+    match = _WRITE_TABLES.match(query)
+    if match:
+        return _table_name(match.group(1))
+    if _READ_ONLY_STATEMENT.match(query):
+        return None
+    if query.lstrip()[:4].upper() == 'WITH' and not _WRITE_KEYWORD.search(query):
+        return None
+    return UNKNOWN_WRITE
+
+
+class LocalVersionStore:
+    """
+    In-process table versions; the default store.
+    """
+    blocking = False
+
+    def snapshot(self, tables):
+        with _versions_lock:
+            return tuple(_versions.get(table, 0) for table in tables)
+
+    def bump(self, tables):
+        with _versions_lock:
+            for table in tables:
+                _versions[table] = _versions.get(table, 0) + 1
+
+
+_store = LocalVersionStore()
+
+
+def set_store(store):
+    """
+    Replace where table versions are kept. store needs snapshot(tables)
+    and bump(tables), plus blocking = False if they do no I/O; a store
+    shared between processes lets a write in one worker invalidate
+    results cached by the others.
+    Returns the previous store.
+    """
+    global _store
+    previous, _store = _store, store
+    return previous
+
+
+def store_blocks():
+    """
+    True if the current store does I/O (any store without a blocking
+    attribute is assumed to), so async callers use it off the event loop.
+    """
+    return getattr(_store, 'blocking', True)
+
+
+def snapshot(tables):
+    """
+    Return the current versions of the given tables, plus UNKNOWN_WRITE.
+    A cached result is still valid while this snapshot is unchanged.
+    """
+    return _store.snapshot(tuple(tables) + (UNKNOWN_WRITE,))
+
+
+def bump(tables):
+    """
+    Advance the version of every given table, and of ANY_WRITE,
+    invalidating cached results that read from them.
+    """
+    if tables:
+        _store.bump(tuple(tables) + (ANY_WRITE,))
+
+
+async def bump_async(tables):
+    """
+    bump for async callers; a store that does I/O is used from a worker
+    thread so the event loop keeps running.
+    """
+    if store_blocks():
+        await asyncio.to_thread(bump, tables)
+    else:
+        bump(tables)
+
+
+def _write_tracer(written):
+    def trace(statement):
+        table = tables_written(statement)
+        if table is not None:
+            written.add(table)
+    return trace
+
+
+@contextmanager
+def track_writes(conn):
+    """
+    Context manager collecting the tables written through a sqlite3
+    connection while it is active. Yields the set being filled in.
+    """
+    written = set()
+    trace = _write_tracer(written)
+    conn.set_trace_callback(trace)
+    try:
+        yield written
+    finally:
+        conn.set_trace_callback(None)
+
+
+@asynccontextmanager
+async def track_writes_async(conn):
+    """
+    Async counterpart of track_writes for an aiosqlite connection.
+    """
+    written = set()
+    trace = _write_tracer(written)
+    await conn.set_trace_callback(trace)
+    try:
+        yield written
+    finally:
+        await conn.set_trace_callback(None)
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the cache keys used by 4-cache_query.
+
+- make_cache_key: params that compare equal in Python but not in SQLite
+  (1, 1.0 and True) must not share a cache entry.
+- normalize_query: whitespace is collapsed outside string literals only,
+  so queries differing inside a literal keep distinct keys.
+- transactional: rows read inside a transaction that is rolled back are
+  never served from the cache afterwards.
+
+Each test runs cached queries against an in-memory SQLite database.
+"""
+
+import sqlite3
+import unittest
+from contextlib import redirect_stdout
+from io import StringIO
+
+cache_query = __import__('4-cache_query')
+transactional = __import__('2-transactional').transactional
+
+
+class TestCacheKeys(unittest.TestCase):
+    """
+    Test suite for make_cache_key and normalize_query.
+
+    Every test gets a fresh cache and a users table whose TEXT names are
+    '1', '1.0' and 'a  b', and checks that a cached query returns what
+    SQLite itself returns.
+    """
+
+    def setUp(self):
+        self.conn = sqlite3.connect(':memory:')
+        self.conn.execute("CREATE TABLE users (name TEXT)")
+        self.conn.executemany("INSERT INTO users VALUES (?)",
+                              [('1',), ('1.0',), ('a  b',)])
+        cache = cache_query.BoundedTTLCache()
+
+        @cache_query.cache_query(expiration=60, cache=cache)
+        def fetch(conn, query, params=None):
+            return conn.execute(query, params or ()).fetchall()
+
+        self.fetch = fetch
+
+    def tearDown(self):
+        self.conn.close()
+
+    def cached(self, query, params=None):
+        with redirect_stdout(StringIO()):
+            return self.fetch(self.conn, query, params)
+
+    def test_numeric_params_of_different_types_get_distinct_keys(self):
+        """int, float and bool params of equal value do not share a key."""
+        keys = {cache_query.make_cache_key("SELECT ?", (value,))
+                for value in (1, 1.0, True)}
+        self.assertEqual(len(keys), 3)
+
+    def test_cached_rows_follow_param_type(self):
+        """A cached (1,) result is not served for (1.0,) or (True,)."""
+        query = "SELECT name FROM users WHERE name = ?"
+        for params in ((1,), (1.0,), (True,)):
+            self.assertEqual(self.cached(query, params),
+                             self.conn.execute(query, params).fetchall())
+        self.assertEqual(self.cached("SELECT ?", (1.0,)), [(1.0,)])
+        self.assertEqual(self.cached("SELECT ?", (1,)), [(1,)])
+
+    def test_whitespace_inside_literals_is_preserved(self):
+        """'a  b' and 'a b' in a literal give distinct keys and results."""
+        spaced = "SELECT name FROM users WHERE name = 'a  b'"
+        single = "SELECT name FROM users WHERE name = 'a b'"
+        self.assertNotEqual(cache_query.make_cache_key(spaced),
+                            cache_query.make_cache_key(single))
+        self.assertEqual(self.cached(spaced), [('a  b',)])
+        self.assertEqual(self.cached(single), [])
+
+    def test_whitespace_outside_literals_is_collapsed(self):
+        """Queries differing only in spacing share one key."""
+        self.assertEqual(
+            cache_query.make_cache_key("SELECT  name\n FROM users", ()),
+            cache_query.make_cache_key("SELECT name FROM users", [])
+        )
+
+
+class TestTransactionalInvalidation(unittest.TestCase):
+    """
+    Test suite for cached reads made inside a transactional function.
+
+    A cached fetch called on the transaction's own connection sees its
+    uncommitted writes; after a rollback the cache must return the
+    committed rows again.
+    """
+
+    def setUp(self):
+        self.conn = sqlite3.connect(':memory:')
+        self.conn.execute("CREATE TABLE users (id INTEGER, email TEXT)")
+        self.conn.execute("INSERT INTO users VALUES (1, 'e4@x')")
+        self.conn.commit()
+        cache = cache_query.BoundedTTLCache()
+
+        @cache_query.cache_query(expiration=60, cache=cache)
+        def fetch(conn, query, params=None):
+            return conn.execute(query, params or ()).fetchall()
+
+        self.fetch = fetch
+
+    def tearDown(self):
+        self.conn.close()
+
+    def cached(self, query):
+        with redirect_stdout(StringIO()):
+            return self.fetch(self.conn, query)
+
+    def test_rolled_back_rows_are_not_served_from_cache(self):
+        """A read of uncommitted rows is dropped when the write rolls back."""
+        query = "SELECT email FROM users WHERE id = 1"
+        self.assertEqual(self.cached(query), [('e4@x',)])
+
+        @transactional()
+        def update_then_fail(conn):
+            conn.execute("UPDATE users SET email = 'phantom' WHERE id = 1")
+            # Inside the transaction the caller sees its own write
+            self.assertEqual(self.cached(query), [('phantom',)])
+            raise ValueError("abort")
+
+        with self.assertRaises(ValueError):
+            update_then_fail(self.conn)
+        self.assertEqual(self.cached(query), [('e4@x',)])
+
+
+if __name__ == '__main__':
+    unittest.main()
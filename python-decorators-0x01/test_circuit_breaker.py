@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the state machine of 6-circuit_breaker.
+
+- closed: the circuit opens once min_calls outcomes are recorded and the
+  share of outage failures reaches failure_rate; other errors do not count.
+- open: calls are rejected with CircuitOpenError until open_seconds pass.
+- half-open: a successful trial call closes the circuit, a failed one
+  reopens it.
+- cancellation: a call ended by CancelledError or KeyboardInterrupt records
+  no outcome and gives its half-open trial slot back.
+
+Decorated functions raise sqlite3 errors directly; no database is opened.
+"""
+
+import asyncio
+import sqlite3
+import unittest
+
+circuit_breaker = __import__('6-circuit_breaker')
+CircuitBreaker = circuit_breaker.CircuitBreaker
+CircuitOpenError = circuit_breaker.CircuitOpenError
+
+
+def outage():
+    raise sqlite3.OperationalError("unable to open database file")
+
+
+def ok():
+    return 'ok'
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    """
+    Test suite for CircuitBreaker driven through the circuit_breaker
+    decorator.
+
+    Each test builds a breaker with a window of 4 calls that opens at a 50%
+    failure rate; open_seconds is 0 where the test needs to reach half-open
+    without waiting.
+    """
+
+    def make_breaker(self, open_seconds=60.0):
+        self.breaker = CircuitBreaker('test', failure_rate=0.5, window_size=4,
+                                      min_calls=4, open_seconds=open_seconds)
+        return circuit_breaker.circuit_breaker(self.breaker)
+
+    def call(self, func):
+        try:
+            return func()
+        except sqlite3.Error:
+            return None
+
+    def open_circuit(self, guard):
+        for func in (ok, ok, outage, outage):
+            self.call(guard(func))
+
+    def test_opens_on_failure_rate(self):
+        """Two outages in four calls open the circuit, not before."""
+        guard = self.make_breaker()
+        for func in (ok, ok, outage):
+            self.call(guard(func))
+        self.assertEqual(self.breaker.state, circuit_breaker.CLOSED)
+        self.call(guard(outage))
+        self.assertEqual(self.breaker.state, circuit_breaker.OPEN)
+        with self.assertRaises(CircuitOpenError):
+            guard(ok)()
+        self.assertEqual(self.breaker.stats()['rejected'], 1)
+
+    def test_call_errors_are_not_failures(self):
+        """A syntax error is the caller's bug and keeps the circuit closed."""
+        guard = self.make_breaker()
+
+        @guard
+        def bad_query():
+            raise sqlite3.OperationalError('near "SELEC": syntax error')
+
+        for _ in range(4):
+            self.call(bad_query)
+        self.assertEqual(self.breaker.state, circuit_breaker.CLOSED)
+        self.assertEqual(self.breaker.stats()['window_failures'], 0)
+
+    def test_half_open_probe_success_closes(self):
+        """A successful trial call after open_seconds closes the circuit."""
+        guard = self.make_breaker(open_seconds=0.0)
+        self.open_circuit(guard)
+        self.assertEqual(self.breaker.state, circuit_breaker.HALF_OPEN)
+        self.assertEqual(guard(ok)(), 'ok')
+        self.assertEqual(self.breaker.state, circuit_breaker.CLOSED)
+
+    def test_half_open_probe_failure_reopens(self):
+        """A failed trial call opens the circuit again."""
+        guard = self.make_breaker(open_seconds=0.0)
+        self.open_circuit(guard)
+        self.assertEqual(self.breaker.state, circuit_breaker.HALF_OPEN)
+        self.breaker.open_seconds = 60.0
+        self.call(guard(outage))
+        self.assertEqual(self.breaker.state, circuit_breaker.OPEN)
+
+    def test_half_open_admits_one_trial_at_a_time(self):
+        """While the trial call runs, other calls are rejected."""
+        guard = self.make_breaker(open_seconds=0.0)
+        self.open_circuit(guard)
+
+        @guard
+        def trial():
+            with self.assertRaises(CircuitOpenError):
+                guard(ok)()
+            return 'ok'
+
+        self.assertEqual(trial(), 'ok')
+        self.assertEqual(self.breaker.state, circuit_breaker.CLOSED)
+
+    def test_interrupted_trial_releases_its_slot(self):
+        """KeyboardInterrupt in a trial neither closes nor blocks the circuit."""
+        guard = self.make_breaker(open_seconds=0.0)
+        self.open_circuit(guard)
+
+        @guard
+        def interrupted():
+            raise KeyboardInterrupt
+
+        with self.assertRaises(KeyboardInterrupt):
+            interrupted()
+        self.assertEqual(self.breaker.state, circuit_breaker.HALF_OPEN)
+        self.breaker.open_seconds = 60.0
+        self.call(guard(outage))
+        self.assertEqual(self.breaker.state, circuit_breaker.OPEN)
+
+    def test_cancelled_coroutine_records_no_outcome(self):
+        """A cancelled async trial leaves the circuit half-open."""
+        guard = self.make_breaker(open_seconds=0.0)
+        self.open_circuit(guard)
+
+        @guard
+        async def slow():
+            await asyncio.sleep(10)
+
+        async def cancel_trial():
+            task = asyncio.ensure_future(slow())
+            await asyncio.sleep(0)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+        asyncio.run(cancel_trial())
+        self.assertEqual(self.breaker.state, circuit_breaker.HALF_OPEN)
+        self.assertEqual(guard(ok)(), 'ok')
+        self.assertEqual(self.breaker.state, circuit_breaker.CLOSED)
+
+    def test_cancelled_call_is_not_counted_while_closed(self):
+        """Cancellation adds nothing to the closed-state window."""
+        guard = self.make_breaker()
+
+        @guard
+        def interrupted():
+            raise KeyboardInterrupt
+
+        with self.assertRaises(KeyboardInterrupt):
+            interrupted()
+        self.assertEqual(self.breaker.stats()['window_calls'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
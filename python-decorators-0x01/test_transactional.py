@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Unit tests for nested calls of 2-transactional.transactional.
+
+The pools hand a thread the connection it already holds, so a
+transactional function called from another one shares its connection.
+
+- a nested call that fails rolls back only its own writes;
+- a nested call that succeeds is committed by the outermost call, or
+  rolled back with it;
+- writes made after a nested call still invalidate cached reads.
+
+Each test runs against a fresh SQLite database in a temporary directory.
+"""
+
+import logging
+import os
+import sqlite3
+import tempfile
+import unittest
+
+transactional_module = __import__('2-transactional')
+transactional = transactional_module.transactional
+table_versions = __import__('table_versions')
+
+
+class TestNestedTransactional(unittest.TestCase):
+    """
+    Test suite for transactional functions calling each other on one
+    connection.
+
+    The users table starts with a single committed row; a second
+    connection to the same file checks what is committed.
+    """
+
+    def setUp(self):
+        logging.getLogger("db_decorators").disabled = True
+        self.tmp = tempfile.TemporaryDirectory()
+        path = os.path.join(self.tmp.name, 'users.db')
+        self.conn = sqlite3.connect(path)
+        self.other = sqlite3.connect(path)
+        self.conn.execute("CREATE TABLE users (id INTEGER, email TEXT)")
+        self.conn.execute("CREATE TABLE audit (event TEXT)")
+        self.conn.execute("INSERT INTO users VALUES (1, 'e1@x')")
+        self.conn.commit()
+
+        @transactional()
+        def add_user(conn, user_id, fail=False):
+            conn.execute("INSERT INTO users VALUES (?, 'new@x')", (user_id,))
+            if fail:
+                raise ValueError("abort")
+
+        self.add_user = add_user
+
+    def tearDown(self):
+        self.other.close()
+        self.conn.close()
+        self.tmp.cleanup()
+        logging.getLogger("db_decorators").disabled = False
+
+    def committed_ids(self):
+        rows = self.other.execute("SELECT id FROM users ORDER BY id")
+        return [row[0] for row in rows]
+
+    def test_failed_nested_call_rolls_back_only_its_writes(self):
+        """The outer call commits its own writes after catching the inner error."""
+        @transactional()
+        def outer(conn):
+            self.add_user(conn, 2)
+            with self.assertRaises(ValueError):
+                self.add_user(conn, 3, fail=True)
+
+        outer(self.conn)
+        self.assertEqual(self.committed_ids(), [1, 2])
+
+    def test_nested_call_does_not_commit_early(self):
+        """A nested success is not visible until the outer call commits."""
+        @transactional()
+        def outer(conn):
+            self.add_user(conn, 2)
+            self.assertEqual(self.committed_ids(), [1])
+
+        outer(self.conn)
+        self.assertEqual(self.committed_ids(), [1, 2])
+
+    def test_nested_call_rolls_back_with_outer(self):
+        """A nested success is undone when the outer call fails."""
+        @transactional()
+        def outer(conn):
+            conn.execute("SELECT * FROM users").fetchall()
+            self.add_user(conn, 2)
+            raise ValueError("abort")
+
+        with self.assertRaises(ValueError):
+            outer(self.conn)
+        self.assertEqual(self.committed_ids(), [1])
+
+    def test_writes_after_nested_call_are_tracked(self):
+        """The outer call still bumps tables written after a nested call."""
+        @transactional()
+        def outer(conn):
+            self.add_user(conn, 2)
+            conn.execute("INSERT INTO audit VALUES ('user 2 added')")
+
+        before = table_versions.snapshot(['audit'])
+        outer(self.conn)
+        self.assertNotEqual(table_versions.snapshot(['audit']), before)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,33 +2,42 @@
 
 import mariadb  # Import the MariaDB connector module to connect to MariaDB
 
-def stream_users():
+seed = __import__('seed')
+predicates = __import__('predicates')
+
+def stream_users(server_side=False, prefetch_size=100, where=None,
+                 compact=False):
     """
     Generator function that streams rows from the user_data table one by one.
     Each row is yielded as a dictionary with keys: user_id, name, email, age.
+    With server_side=True rows come from a server-side cursor that fetches
+    prefetch_size rows per round trip instead of buffering the whole table.
+    where is an optional predicates.Predicate applied by the database.
+    With compact=True rows are seed.UserRow objects instead of dictionaries.
     """
     cursor = None
     connection = None
 
     try:
-        # Connect to the ALX_prodev database on MariaDB server
-        connection = mariadb.connect(
-            host='localhost',
-            user='root',       # Replace with your MariaDB username
-            password='1395',   # Replace with your MariaDB password
-            database='ALX_prodev'
-        )
+        # Borrow a connection from the shared ALX_prodev pool
+        connection = seed.get_connection()
 
         # Create a cursor that returns rows as dictionaries
-        cursor = connection.cursor(dictionary=True)
+        cursor = seed.open_stream_cursor(
+            connection, server_side, prefetch_size, dictionary=not compact
+        )
 
         # Execute query to select all users from user_data
-        cursor.execute("SELECT user_id, name, email, age FROM user_data")
+        where_sql, params = predicates.where_clause(where)
+        cursor.execute(
+            "SELECT user_id, name, email, age FROM user_data" + where_sql,
+            tuple(params)
+        )
 
         # Fetch and yield rows one by one using a single loop
         row = cursor.fetchone()
         while row:
-            yield row
+            yield seed.UserRow(*row) if compact else row
             row = cursor.fetchone()
 
     except mariadb.Error as err:
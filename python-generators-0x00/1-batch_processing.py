@@ -1,32 +1,140 @@
 #!/usr/bin/python3
 import mariadb
 
-def stream_users_in_batches(batch_size):
+try:
+    import numpy as np
+except ImportError:  # numpy is only needed for columnar='numpy'
+    np = None
+
+try:
+    import pyarrow as pa
+except ImportError:  # pyarrow is only needed for columnar='arrow'
+    pa = None
+
+seed = __import__('seed')
+predicates = __import__('predicates')
+col = predicates.col
+
+
+def rows_to_numpy(rows):
+    """
+    Turn a list of (user_id, name, email, age) tuples into a dict of
+    NumPy arrays, one per column. Ages become float64 so they can be
+    aggregated and filtered vectorised.
+    """
+    user_ids, names, emails, ages = zip(*rows)
+    return {
+        'user_id': np.array(user_ids, dtype='U36'),
+        'name': np.array(names, dtype=object),
+        'email': np.array(emails, dtype=object),
+        'age': np.array(ages, dtype=np.float64),
+    }
+
+
+def rows_to_arrow(rows):
+    """
+    Turn a list of (user_id, name, email, age) tuples into an Arrow
+    RecordBatch with float64 ages.
+    """
+    user_ids, names, emails, ages = zip(*rows)
+    return pa.RecordBatch.from_arrays(
+        [
+            pa.array(user_ids, type=pa.string()),
+            pa.array(names, type=pa.string()),
+            pa.array(emails, type=pa.string()),
+            pa.array([float(age) for age in ages], type=pa.float64()),
+        ],
+        names=list(seed.USER_COLUMNS)
+    )
+
+
+COLUMNAR_BUILDERS = {
+    'numpy': rows_to_numpy,
+    'arrow': rows_to_arrow,
+}
+
+
+def _columnar_builder(columnar):
+    """
+    Return the batch builder for a columnar mode, checking that its
+    optional dependency is installed.
+    """
+    if columnar not in COLUMNAR_BUILDERS:
+        raise ValueError(f"Unknown columnar mode: {columnar!r}")
+    if columnar == 'numpy' and np is None:
+        raise ImportError("columnar='numpy' requires numpy")
+    if columnar == 'arrow' and pa is None:
+        raise ImportError("columnar='arrow' requires pyarrow")
+    return COLUMNAR_BUILDERS[columnar]
+
+
+def stream_users_in_batches(batch_size, where=None, columnar=None,
+                            compact=False, checkpoint=None,
+                            checkpoint_every=10):
     """
     Generator that fetches rows from user_data table in batches of size batch_size.
     Each batch is a list of dictionaries.
+    where is an optional predicates.Predicate applied by the database.
+    With columnar='numpy' each batch is instead a dict of NumPy arrays keyed
+    by column, and with columnar='arrow' an Arrow RecordBatch; both are
+    built straight from fetchmany tuples without per-row dicts.
+    With compact=True each batch is a list of seed.UserRow objects.
+
+    checkpoint is an optional checkpoint.FileCheckpoint or TableCheckpoint.
+    With one, rows are read in user_id order starting after the saved key,
+    and the position is saved every checkpoint_every batches once the
+    consumer asks for the next batch, i.e. after it finished the previous
+    ones. After a crash at most checkpoint_every batches are redone. The
+    checkpoint is cleared when the stream completes.
     """
+    if checkpoint_every < 1:
+        raise ValueError("checkpoint_every must be at least 1")
+    if columnar and compact:
+        raise ValueError("columnar and compact cannot be combined")
+    if columnar:
+        build_batch = _columnar_builder(columnar)
+    elif compact:
+        build_batch = seed.user_rows
+    else:
+        build_batch = None
     connection = None
     cursor = None
     try:
-        # Connect to MariaDB ALX_prodev database
-        connection = mariadb.connect(
-            host='localhost',
-            user='root',
-            password='1395',
-            database='ALX_prodev'
-        )
-        cursor = connection.cursor(dictionary=True)
-
-        # Execute query to select all users
-        cursor.execute("SELECT user_id, name, email, age FROM user_data")
+        # Borrow a connection from the shared ALX_prodev pool
+        connection = seed.get_connection()
+        cursor = connection.cursor(dictionary=build_batch is None)
+
+        query = "SELECT user_id, name, email, age FROM user_data"
+        last_key, batch_number = None, 0
+        if checkpoint is not None:
+            # Resume right after the last key the previous run finished
+            last_key, batch_number = checkpoint.load()
+            if last_key is not None:
+                resume = col('user_id') > last_key
+                where = resume if where is None else where & resume
+
+        # Execute query to select the matching users
+        where_sql, params = predicates.where_clause(where)
+        if checkpoint is not None:
+            where_sql += " ORDER BY user_id"
+        cursor.execute(query + where_sql, tuple(params))
 
         while True:
             # Fetch batch_size number of rows
             batch = cursor.fetchmany(batch_size)
             if not batch:
                 break
-            yield batch
+            yield batch if build_batch is None else build_batch(batch)
+
+            if checkpoint is not None:
+                batch_number += 1
+                last_key = (batch[-1]['user_id'] if build_batch is None
+                            else batch[-1][0])
+                if batch_number % checkpoint_every == 0:
+                    checkpoint.save(last_key, batch_number)
+
+        if checkpoint is not None:
+            checkpoint.clear()
 
     except mariadb.Error as err:
         print(f"Database error: {err}")
@@ -37,15 +145,22 @@ def stream_users_in_batches(batch_size):
             connection.close()
 
 
-def batch_processing(batch_size):
+def batch_processing(batch_size, where=None, compact=False, checkpoint=None,
+                     checkpoint_every=10):
     """
     Processes each batch from stream_users_in_batches and yields users over age 25.
+    The age filter runs in the database, combined with any extra where predicate.
+    Pass a checkpoint to make the run resumable after a crash.
     """
+    over_25 = col('age') > 25
+    if where is not None:
+        over_25 = over_25 & where
+
     # Loop 1: Iterate over batches from the generator
-    for batch in stream_users_in_batches(batch_size):
-        # Loop 2: Iterate over each user in the batch
-        for user in batch:
-            # Filter users over age 24
-            if user['age'] > 25:
-                yield user
+    for batch in stream_users_in_batches(batch_size, where=over_25,
+                                         compact=compact,
+                                         checkpoint=checkpoint,
+                                         checkpoint_every=checkpoint_every):
+        # Every row in the batch already matched the filter
+        yield from batch
 
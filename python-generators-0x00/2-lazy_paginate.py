@@ -1,36 +1,192 @@
 #!/usr/bin/python3
+import base64
+import queue
+import threading
+
 seed = __import__('seed')
 
-def paginate_users(page_size, offset):
+
+def encode_cursor(user_id):
+    """
+    Encode the last user_id of a page into an opaque cursor token.
+    The token can be passed back to lazy_pagination to resume the walk.
+    """
+    return base64.urlsafe_b64encode(user_id.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(token):
+    """
+    Decode a cursor token produced by encode_cursor back into a user_id.
+    """
+    try:
+        return base64.urlsafe_b64decode(token.encode('ascii')).decode('utf-8')
+    except (ValueError, UnicodeError) as err:
+        raise ValueError(f"Invalid pagination cursor: {token!r}") from err
+
+
+def page_cursor(page):
+    """
+    Return the cursor token that resumes pagination right after the given page.
+    """
+    if not page:
+        return None
+    return encode_cursor(page[-1]['user_id'])
+
+
+def paginate_users(page_size, offset, connection=None, compact=False):
     """
     Fetch a page of users from the database with LIMIT and OFFSET.
     Returns a list of dictionaries representing users.
+    If a connection is given it is reused and left open for the caller.
+    With compact=True the page holds seed.UserRow objects instead.
     """
-    connection = seed.connect_to_prodev()
-    cursor = connection.cursor(dictionary=True)
-    cursor.execute(f"SELECT * FROM user_data LIMIT {page_size} OFFSET {offset}")
+    own_connection = connection is None
+    if own_connection:
+        connection = seed.connect_to_prodev()
+    cursor = connection.cursor(dictionary=not compact)
+    cursor.execute(
+        "SELECT user_id, name, email, age FROM user_data "
+        "ORDER BY user_id LIMIT ? OFFSET ?",
+        (page_size, offset)
+    )
     rows = cursor.fetchall()
     cursor.close()
-    connection.close()
-    return rows
+    if own_connection:
+        connection.close()
+    return seed.user_rows(rows) if compact else rows
+
 
-def lazy_pagination(page_size):
+def paginate_users_after(connection, page_size, last_user_id=None,
+                         compact=False):
     """
-    Generator that lazily fetches pages of users from the database.
-    Fetches the next page only when needed.
-    Uses only one loop.
+    Fetch the page of users that follows last_user_id using keyset (seek)
+    pagination. The primary key index is used to jump straight to the
+    start of the page, so every page costs the same however deep it is.
+    """
+    cursor = connection.cursor(dictionary=not compact)
+    if last_user_id is None:
+        cursor.execute(
+            "SELECT user_id, name, email, age FROM user_data "
+            "ORDER BY user_id LIMIT ?",
+            (page_size,)
+        )
+    else:
+        cursor.execute(
+            "SELECT user_id, name, email, age FROM user_data "
+            "WHERE user_id > ? ORDER BY user_id LIMIT ?",
+            (last_user_id, page_size)
+        )
+    rows = cursor.fetchall()
+    cursor.close()
+    return seed.user_rows(rows) if compact else rows
+
+
+def _walk_pages(page_size, keyset, last_user_id, compact=False):
+    """
+    Generator over every page of users on one connection, starting after
+    last_user_id in keyset mode or at offset 0 otherwise.
     """
     offset = 0
+    connection = seed.connect_to_prodev()
+    if connection is None:
+        return
+
+    try:
+        while True:
+            # Fetch the next page on the shared connection
+            if keyset:
+                page = paginate_users_after(connection, page_size,
+                                            last_user_id, compact)
+            else:
+                page = paginate_users(page_size, offset, connection, compact)
+            if not page:
+                # No more data, stop iteration
+                break
+
+            yield page  # Yield the current page (list of user dicts)
 
-    while True:
-        # Fetch the next page using paginate_users
-        page = paginate_users(page_size, offset)
-        if not page:
-            # No more data, stop iteration
-            break
+            # Advance to the next page
+            last_user_id = page[-1]['user_id']
+            offset += page_size
+    finally:
+        connection.close()
 
-        yield page  # Yield the current page (list of user dicts)
 
-        # Increase offset for the next page
-        offset += page_size
+_END_OF_PAGES = object()
+
+
+def _prefetch_pages(pages, prefetch):
+    """
+    Generator that reads pages from the pages generator on a background
+    thread, keeping up to prefetch pages ready in a bounded queue while the
+    consumer works on the current one. Stopping early (for example through
+    islice) stops the reader and closes its connection.
+    """
+    ready = queue.Queue(maxsize=prefetch)
+    stop = threading.Event()
+
+    def put(item):
+        # Wait for room in the queue, giving up once the consumer has stopped
+        while not stop.is_set():
+            try:
+                ready.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def reader():
+        try:
+            for page in pages:
+                if not put(page):
+                    break
+            put(_END_OF_PAGES)
+        except BaseException as err:
+            put(err)
+        finally:
+            pages.close()
+
+    thread = threading.Thread(target=reader, name="lazy_pagination-prefetch",
+                              daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = ready.get()
+            if item is _END_OF_PAGES:
+                break
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        stop.set()
+        thread.join()
+
+
+def lazy_pagination(page_size, keyset=False, cursor=None, prefetch=0,
+                    compact=False):
+    """
+    Generator that lazily fetches pages of users from the database.
+    Fetches the next page only when needed.
+    Uses only one loop.
+
+    A single connection is kept open for the whole walk.
+    With keyset=True pages are fetched with WHERE user_id > last_seen
+    instead of OFFSET; cursor is an optional token from page_cursor()
+    to resume a previous keyset walk.
+    With prefetch=K the next K pages are read ahead on a background thread
+    while the current page is being processed.
+    With compact=True pages hold seed.UserRow objects instead of dictionaries.
+    """
+    if cursor is not None and not keyset:
+        raise ValueError("A resume cursor requires keyset=True")
+    if prefetch < 0:
+        raise ValueError("prefetch must not be negative")
 
+    last_user_id = decode_cursor(cursor) if cursor is not None else None
+    pages = _walk_pages(page_size, keyset, last_user_id, compact)
+    if prefetch:
+        pages = _prefetch_pages(pages, prefetch)
+    try:
+        yield from pages
+    finally:
+        pages.close()
@@ -1,23 +1,26 @@
 #!/usr/bin/python3
 import mariadb
 
-def stream_user_ages():
+seed = __import__('seed')
+predicates = __import__('predicates')
+
+def stream_user_ages(server_side=False, prefetch_size=100, where=None):
     """
     Generator that connects to the ALX_prodev database and yields user ages one by one.
+    With server_side=True ages are read through a server-side cursor,
+    prefetch_size rows per round trip.
+    where is an optional predicates.Predicate applied by the database.
     """
     connection = None
     cursor = None
     try:
-        connection = mariadb.connect(
-            host='localhost',
-            user='root',           # Replace with your MariaDB username
-            password='1395',       # Replace with your MariaDB password
-            database='ALX_prodev'
-        )
-        cursor = connection.cursor()
+        # Borrow a connection from the shared ALX_prodev pool
+        connection = seed.get_connection()
+        cursor = seed.open_stream_cursor(connection, server_side, prefetch_size)
 
         # Execute query to fetch only the age column for all users
-        cursor.execute("SELECT age FROM user_data")
+        where_sql, params = predicates.where_clause(where)
+        cursor.execute("SELECT age FROM user_data" + where_sql, tuple(params))
 
         # Fetch one age at a time and yield it
         age = cursor.fetchone()
@@ -35,25 +38,247 @@ def stream_user_ages():
             connection.close()
 
 
-def calculate_average_age():
+class AgeAccumulator:
+    """
+    Single-pass accumulator for streamed ages.
+    Keeps count, sum, min and max, a Welford running mean and variance, and
+    a count per distinct age. Ages are whole numbers in a small range, so
+    the per-age counts stay tiny and give exact percentiles and histograms
+    without holding the stream in memory.
+    """
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = None
+        self.max = None
+        self.value_counts = {}
+
+    def add(self, age):
+        """
+        Fold one age into the running statistics.
+        """
+        age = float(age)
+        self.count += 1
+        self.total += age
+        delta = age - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (age - self.mean)
+        if self.min is None or age < self.min:
+            self.min = age
+        if self.max is None or age > self.max:
+            self.max = age
+        self.value_counts[age] = self.value_counts.get(age, 0) + 1
+
+    def variance(self):
+        """
+        Sample variance, matching SQL VAR_SAMP.
+        """
+        if self.count < 2:
+            return None
+        return self.m2 / (self.count - 1)
+
+    def percentile(self, fraction):
+        """
+        Continuous percentile with linear interpolation, matching SQL
+        PERCENTILE_CONT.
+        """
+        if self.count == 0:
+            return None
+        rank = fraction * (self.count - 1)
+        lower_rank = int(rank)
+        upper_rank = min(lower_rank + 1, self.count - 1)
+        lower = upper = None
+        seen = 0
+        for age in sorted(self.value_counts):
+            seen += self.value_counts[age]
+            if lower is None and seen > lower_rank:
+                lower = age
+            if seen > upper_rank:
+                upper = age
+                break
+        return lower + (upper - lower) * (rank - lower_rank)
+
+    def histogram(self, bucket_size):
+        """
+        Count ages per bucket of width bucket_size, keyed by bucket start.
+        """
+        buckets = {}
+        for age, count in self.value_counts.items():
+            bucket = (age // bucket_size) * bucket_size
+            buckets[bucket] = buckets.get(bucket, 0) + count
+        return dict(sorted(buckets.items()))
+
+
+# Registry of scalar aggregates: name -> (SQL expression, accumulator reader)
+AGGREGATES = {}
+
+
+def register_aggregate(name, sql_expression, reader):
     """
-    Uses stream_user_ages generator to calculate average age without loading all data at once.
-    Uses no more than two loops.
+    Register a scalar aggregate over user_data.age.
+    sql_expression is used when the query is pushed down to the database,
+    reader(accumulator) computes the same value from an AgeAccumulator.
     """
-    total_age = 0
-    count = 0
+    AGGREGATES[name] = (sql_expression, reader)
 
-    # Loop 1: Iterate over ages yielded one by one
-    for age in stream_user_ages():
-        total_age += age
-        count += 1
 
-    if count == 0:
+register_aggregate('count', "COUNT(age)", lambda acc: acc.count)
+register_aggregate('sum', "SUM(age)",
+                   lambda acc: acc.total if acc.count else None)
+register_aggregate('avg', "AVG(age)",
+                   lambda acc: acc.mean if acc.count else None)
+register_aggregate('min', "MIN(age)", lambda acc: acc.min)
+register_aggregate('max', "MAX(age)", lambda acc: acc.max)
+register_aggregate('variance', "VAR_SAMP(age)",
+                   lambda acc: acc.variance())
+register_aggregate('stddev', "STDDEV_SAMP(age)",
+                   lambda acc: None if acc.count < 2 else acc.variance() ** 0.5)
+
+
+def _to_number(value):
+    """
+    Convert Decimal results from the connector to plain numbers.
+    """
+    if value is None or isinstance(value, int):
+        return value
+    return float(value)
+
+
+def _validate_request(stats, percentiles, bucket_size):
+    """
+    Reject unknown aggregates, out-of-range percentiles and bad bucket sizes
+    before anything is sent to the database.
+    """
+    unknown = [name for name in stats if name not in AGGREGATES]
+    if unknown:
+        raise ValueError(f"Unknown aggregate(s): {', '.join(unknown)}")
+    for fraction in percentiles:
+        if not 0 <= fraction <= 1:
+            raise ValueError(f"Percentile must be between 0 and 1: {fraction}")
+    if bucket_size is not None and bucket_size <= 0:
+        raise ValueError("bucket_size must be positive")
+
+
+def _sql_age_stats(connection, stats, percentiles, bucket_size, where=None):
+    """
+    Compute the requested statistics with aggregate queries so only the
+    results leave the database. where is an optional predicates.Predicate
+    restricting the rows aggregated.
+    """
+    where_sql, where_params = predicates.where_clause(where)
+    result = {}
+    cursor = connection.cursor()
+    try:
+        if stats:
+            expressions = ", ".join(AGGREGATES[name][0] for name in stats)
+            cursor.execute(f"SELECT {expressions} FROM user_data" + where_sql,
+                           tuple(where_params))
+            row = cursor.fetchone()
+            for name, value in zip(stats, row):
+                result[name] = _to_number(value)
+
+        if percentiles:
+            # Fractions are validated floats, so they are safe to inline
+            expressions = ", ".join(
+                f"PERCENTILE_CONT({float(fraction)}) "
+                "WITHIN GROUP (ORDER BY age) OVER ()"
+                for fraction in percentiles
+            )
+            cursor.execute(
+                f"SELECT {expressions} FROM user_data" + where_sql + " LIMIT 1",
+                tuple(where_params)
+            )
+            row = cursor.fetchone() or (None,) * len(percentiles)
+            result['percentiles'] = {
+                fraction: _to_number(value)
+                for fraction, value in zip(percentiles, row)
+            }
+
+        if bucket_size is not None:
+            cursor.execute(
+                "SELECT FLOOR(age / ?) * ? AS bucket, COUNT(*) "
+                "FROM user_data" + where_sql +
+                " GROUP BY bucket ORDER BY bucket",
+                (bucket_size, bucket_size) + tuple(where_params)
+            )
+            result['histogram'] = {
+                _to_number(bucket): count
+                for bucket, count in cursor.fetchall()
+            }
+    finally:
+        cursor.close()
+    return result
+
+
+def _streaming_age_stats(stats, percentiles, bucket_size, **stream_options):
+    """
+    Compute the requested statistics in one pass over stream_user_ages.
+    """
+    accumulator = AgeAccumulator()
+    for age in stream_user_ages(**stream_options):
+        accumulator.add(age)
+
+    result = {name: AGGREGATES[name][1](accumulator) for name in stats}
+    if percentiles:
+        result['percentiles'] = {
+            fraction: accumulator.percentile(fraction)
+            for fraction in percentiles
+        }
+    if bucket_size is not None:
+        result['histogram'] = accumulator.histogram(bucket_size)
+    return result
+
+
+def age_stats(stats=('count', 'avg', 'min', 'max'), percentiles=(),
+              bucket_size=None, pushdown=True, **stream_options):
+    """
+    Compute statistics over user ages.
+
+    stats names registered aggregates (count, sum, avg, min, max, variance,
+    stddev), percentiles is a sequence of fractions such as (0.5, 0.95) and
+    bucket_size turns on an age histogram. Results are returned as a dict;
+    percentiles and histogram appear under their own keys.
+
+    With pushdown=True the work runs as SQL aggregates. If the server cannot
+    run them, the stats fall back to a single streaming pass over
+    stream_user_ages, which receives any extra stream_options. A where
+    predicate in stream_options filters both the SQL aggregates and the
+    streaming fallback.
+    """
+    stats = tuple(stats)
+    percentiles = tuple(percentiles)
+    _validate_request(stats, percentiles, bucket_size)
+
+    if pushdown:
+        connection = seed.connect_to_prodev()
+        if connection is not None:
+            try:
+                return _sql_age_stats(connection, stats, percentiles,
+                                      bucket_size, stream_options.get('where'))
+            except mariadb.Error as err:
+                print(f"Aggregate pushdown failed, streaming instead: {err}")
+            finally:
+                connection.close()
+
+    return _streaming_age_stats(stats, percentiles, bucket_size,
+                                **stream_options)
+
+
+def calculate_average_age():
+    """
+    Calculates the average user age without loading all ages into memory.
+    The average is computed by the database when possible, otherwise in a
+    single pass over the stream_user_ages generator.
+    """
+    stats = age_stats(stats=('count', 'avg'))
+
+    if not stats['count']:
         print("No users found.")
         return
 
-    average_age = total_age / count
-    print(f"Average age of users: {average_age:.2f}")
+    print(f"Average age of users: {stats['avg']:.2f}")
 
 
 if __name__ == "__main__":
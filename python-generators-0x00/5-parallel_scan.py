@@ -0,0 +1,206 @@
+#!/usr/bin/python3
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import mariadb
+
+seed = __import__('seed')
+predicates = __import__('predicates')
+col = predicates.col
+
+# user_id values are UUID strings, so their first four hex digits spread
+# rows evenly over this many prefixes
+KEY_PREFIX_SPACE = 16 ** 4
+
+
+def key_ranges(partitions):
+    """
+    Split the user_id key space into contiguous (low, high) ranges.
+    low is inclusive and high exclusive; None means unbounded on that side.
+    Ranges come back in key order.
+    """
+    if partitions < 1:
+        raise ValueError("partitions must be at least 1")
+    bounds = [
+        f"{i * KEY_PREFIX_SPACE // partitions:04x}"
+        for i in range(1, partitions)
+    ]
+    lows = [None] + bounds
+    highs = bounds + [None]
+    return list(zip(lows, highs))
+
+
+def range_predicate(key_range, where=None):
+    """
+    Build the predicate selecting one key range, combined with where.
+    """
+    low, high = key_range
+    predicate = where
+    for bound in (
+        col('user_id') >= low if low is not None else None,
+        col('user_id') < high if high is not None else None,
+    ):
+        if bound is not None:
+            predicate = bound if predicate is None else predicate & bound
+    return predicate
+
+
+def scan_range(key_range, after=None, chunk_size=1000, where=None):
+    """
+    Worker: read the next chunk of up to chunk_size users in one key range
+    on its own connection, resuming after the user_id after (keyset
+    pagination). Returns (rows, next_after): rows are (user_id, name,
+    email, age) tuples in user_id order, and next_after is the key to
+    resume from, or None once the range is exhausted.
+    """
+    if after is not None:
+        where = col('user_id') > after if where is None else where & (
+            col('user_id') > after
+        )
+    connection = seed.get_connection()
+    cursor = connection.cursor()
+    try:
+        where_sql, params = predicates.where_clause(
+            range_predicate(key_range, where)
+        )
+        cursor.execute(
+            "SELECT user_id, name, email, age FROM user_data"
+            + where_sql + " ORDER BY user_id LIMIT ?",
+            tuple(params) + (chunk_size,)
+        )
+        rows = cursor.fetchall()
+        next_after = rows[-1][0] if len(rows) == chunk_size else None
+        return rows, next_after
+    finally:
+        cursor.close()
+        connection.close()
+
+
+def range_age_totals(key_range, where=None):
+    """
+    Worker: return (count, sum of ages) for one key range.
+    """
+    connection = seed.get_connection()
+    cursor = connection.cursor()
+    try:
+        where_sql, params = predicates.where_clause(
+            range_predicate(key_range, where)
+        )
+        cursor.execute(
+            "SELECT COUNT(age), COALESCE(SUM(age), 0) FROM user_data"
+            + where_sql,
+            tuple(params)
+        )
+        count, total = cursor.fetchone()
+        return count, float(total)
+    finally:
+        cursor.close()
+        connection.close()
+
+
+def parallel_map(worker, partitions=None, workers=None, ordered=True,
+                 resumable=False, in_flight=None, **worker_kwargs):
+    """
+    Generator that runs worker(key_range, **worker_kwargs) for every key
+    range in a process pool and yields the results.
+    With ordered=True results follow key order; otherwise each result is
+    yielded as soon as its range finishes.
+
+    With resumable=True the worker also takes after= and returns
+    (result, next_after); each range is then read as a series of chunks,
+    the next one submitted only once the previous result is consumed.
+    At most in_flight tasks (default twice the workers) are submitted or
+    waiting to be consumed at once, so a slow consumer or a slow first
+    range never lets finished results pile up in memory.
+    """
+    workers = workers or os.cpu_count() or 1
+    partitions = partitions or workers * 4
+    in_flight = in_flight or workers * 2
+    ranges = iter(enumerate(key_ranges(partitions)))
+    running = {}  # range index -> (key_range, future)
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        def start(index, key_range, after=None):
+            kwargs = dict(worker_kwargs, after=after) if resumable else worker_kwargs
+            running[index] = (key_range, executor.submit(worker, key_range, **kwargs))
+
+        def start_next_range():
+            for index, key_range in ranges:
+                start(index, key_range)
+                return
+
+        try:
+            for _ in range(in_flight):
+                start_next_range()
+            while running:
+                if ordered:
+                    # Ranges start in key order, so the lowest index is next
+                    index = min(running)
+                else:
+                    done, _ = wait([future for _, future in running.values()],
+                                   return_when=FIRST_COMPLETED)
+                    index = next(i for i, (_, future) in running.items()
+                                 if future in done)
+                key_range, future = running.pop(index)
+                result = future.result()
+                if resumable:
+                    result, next_after = result
+                else:
+                    next_after = None
+                yield result
+                if next_after is not None:
+                    start(index, key_range, next_after)
+                else:
+                    start_next_range()
+        finally:
+            # Stop ranges that have not started if the consumer bails out
+            for _, future in running.values():
+                future.cancel()
+
+
+def parallel_scan(partitions=None, workers=None, ordered=True, where=None,
+                  compact=False, chunk_size=1000):
+    """
+    Generator that streams every user as a dictionary, reading user_data
+    as key ranges in parallel worker processes, each on its own connection.
+    Each range is read chunk_size rows at a time, so memory stays bounded
+    by a few chunks per worker however large the table is.
+    With ordered=True users come out in user_id order.
+    With compact=True users are seed.UserRow objects instead.
+    """
+    try:
+        for rows in parallel_map(scan_range, partitions, workers, ordered,
+                                 resumable=True, chunk_size=chunk_size,
+                                 where=where):
+            for row in rows:
+                if compact:
+                    yield seed.UserRow(*row)
+                else:
+                    yield dict(zip(seed.USER_COLUMNS, row))
+    except mariadb.Error as err:
+        print(f"Database error: {err}")
+
+
+def parallel_average_age(partitions=None, workers=None, where=None):
+    """
+    Average user age computed as per-range totals in parallel workers.
+    Returns None when no users match.
+    """
+    count = 0
+    total = 0.0
+    for range_count, range_total in parallel_map(
+            range_age_totals, partitions, workers, ordered=False,
+            where=where):
+        count += range_count
+        total += range_total
+    if count == 0:
+        return None
+    return total / count
+
+
+if __name__ == "__main__":
+    average_age = parallel_average_age()
+    if average_age is None:
+        print("No users found.")
+    else:
+        print(f"Average age of users: {average_age:.2f}")
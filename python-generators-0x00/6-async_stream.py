@@ -0,0 +1,153 @@
+#!/usr/bin/python3
+import asyncio
+
+import mariadb
+
+seed = __import__('seed')
+predicates = __import__('predicates')
+lazy_paginate = __import__('2-lazy_paginate')
+
+
+class _BlockingCalls:
+    """
+    Runs one stream's blocking connector calls on worker threads from
+    executor (the loop's default executor if None), one at a time.
+
+    A connector call cannot be interrupted once its thread has started, so
+    each call is shielded from cancellation and drain() waits for any call
+    still running before the stream closes its cursor and connection.
+    Otherwise a cancelled consumer would have cleanup run on a second
+    thread while the first still uses the connection.
+    """
+    def __init__(self, executor=None):
+        self.executor = executor
+        self._pending = None
+
+    async def run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        self._pending = loop.run_in_executor(self.executor, func, *args)
+        return await asyncio.shield(self._pending)
+
+    async def drain(self):
+        """
+        Wait for the call in flight, if any; its outcome is ignored.
+        """
+        if self._pending is not None and not self._pending.done():
+            await asyncio.wait([self._pending])
+
+
+async def async_stream_users_in_batches(batch_size, where=None, executor=None):
+    """
+    Async generator that yields batches of users (lists of dictionaries).
+    Every connector call runs on a worker thread from executor (the loop's
+    default executor if None). The next batch is only fetched once the
+    consumer asks for it, so a slow consumer holds back the database read
+    instead of letting rows pile up in memory.
+    """
+    calls = _BlockingCalls(executor)
+    connection = None
+    cursor = None
+    try:
+        # Borrow a connection from the shared ALX_prodev pool
+        connection = await calls.run(seed.get_connection)
+        cursor = connection.cursor(dictionary=True)
+
+        where_sql, params = predicates.where_clause(where)
+        await calls.run(
+            cursor.execute,
+            "SELECT user_id, name, email, age FROM user_data" + where_sql,
+            tuple(params)
+        )
+
+        while True:
+            batch = await calls.run(cursor.fetchmany, batch_size)
+            if not batch:
+                break
+            yield batch
+
+    except mariadb.Error as err:
+        print(f"Database error: {err}")
+    finally:
+        await calls.drain()
+        if cursor:
+            await calls.run(cursor.close)
+        if connection:
+            await calls.run(connection.close)
+
+
+async def async_stream_users(where=None, fetch_size=100, executor=None):
+    """
+    Async generator that yields users one by one as dictionaries.
+    Rows are fetched fetch_size at a time so each thread hop is shared by
+    many rows.
+    """
+    async for batch in async_stream_users_in_batches(fetch_size, where,
+                                                     executor):
+        for row in batch:
+            yield row
+
+
+async def async_lazy_pagination(page_size, keyset=False, cursor=None,
+                                executor=None):
+    """
+    Async generator equivalent of lazy_pagination.
+    Pages are fetched on a worker thread over one connection, and only
+    when the consumer asks for the next page.
+    """
+    if cursor is not None and not keyset:
+        raise ValueError("A resume cursor requires keyset=True")
+
+    last_user_id = (lazy_paginate.decode_cursor(cursor)
+                    if cursor is not None else None)
+    offset = 0
+    calls = _BlockingCalls(executor)
+    connection = await calls.run(seed.connect_to_prodev)
+    if connection is None:
+        return
+
+    try:
+        while True:
+            if keyset:
+                page = await calls.run(
+                    lazy_paginate.paginate_users_after,
+                    connection, page_size, last_user_id
+                )
+            else:
+                page = await calls.run(
+                    lazy_paginate.paginate_users,
+                    page_size, offset, connection
+                )
+            if not page:
+                break
+
+            yield page
+
+            last_user_id = page[-1]['user_id']
+            offset += page_size
+    finally:
+        await calls.drain()
+        await calls.run(connection.close)
+
+
+async def main():
+    """
+    Run two streams concurrently on one event loop.
+    """
+    async def count_users():
+        count = 0
+        async for _ in async_stream_users():
+            count += 1
+        return count
+
+    async def count_pages():
+        count = 0
+        async for _ in async_lazy_pagination(100, keyset=True):
+            count += 1
+        return count
+
+    users, pages = await asyncio.gather(count_users(), count_pages())
+    print(f"Streamed {users} users and {pages} pages concurrently")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
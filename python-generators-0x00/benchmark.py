@@ -0,0 +1,211 @@
+#!/usr/bin/python3
+"""
+Benchmarks for the user_data streaming generators.
+
+Run it with:
+    ./benchmark.py [--sizes 10000 1000000 10000000] [--output results.json]
+
+For every table size a database named ALX_bench_<size> is seeded once on
+the MariaDB server configured through the ALX_DB_* variables, with
+synthetic users from a fixed random seed, and reused on later runs. Each
+strategy is then swept over its batch/page/prefetch sizes. Every
+measurement runs in a fresh child process, so the peak resident set size
+(ru_maxrss) it reports belongs to that measurement only; the peak_rss_kb
+column across table sizes is the memory-versus-row-count report.
+
+OFFSET pagination rescans every skipped row, so it is quadratic in the
+table size: at 10M rows and page_size 100 it would issue 100k queries
+over up to 10M rows each. It is skipped for tables larger than
+--offset-max-rows (default 1M).
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import tempfile
+import time
+
+seed = __import__('seed')
+
+DEFAULT_SIZES = (10000, 1000000, 10000000)
+DEFAULT_SWEEP = (100, 1000, 10000)
+DEFAULT_OFFSET_MAX_ROWS = 1000000
+RANDOM_SEED = 1395
+
+# name -> (module, generator, sweep parameter or None, fixed kwargs,
+#          True if the generator yields lists of rows)
+STRATEGIES = {
+    'stream_users': ('0-stream_users', 'stream_users', None, {}, False),
+    'stream_users_server_side': ('0-stream_users', 'stream_users',
+                                 'prefetch_size', {'server_side': True},
+                                 False),
+    'stream_users_in_batches': ('1-batch_processing',
+                                'stream_users_in_batches', 'batch_size', {},
+                                True),
+    'lazy_pagination_offset': ('2-lazy_paginate', 'lazy_pagination',
+                               'page_size', {}, True),
+    'lazy_pagination_keyset': ('2-lazy_paginate', 'lazy_pagination',
+                               'page_size', {'keyset': True}, True),
+    'stream_user_ages': ('4-stream_ages', 'stream_user_ages', None, {},
+                         False),
+    'stream_user_ages_server_side': ('4-stream_ages', 'stream_user_ages',
+                                     'prefetch_size', {'server_side': True},
+                                     False),
+}
+
+
+def bench_database(size):
+    """
+    Name of the benchmark database holding size rows.
+    """
+    return f"ALX_bench_{size}"
+
+
+def write_synthetic_csv(path, size):
+    """
+    Write size reproducible synthetic users in the user_data.csv format.
+    """
+    rng = random.Random(RANDOM_SEED)
+    with open(path, 'w', newline='') as csvfile:
+        csvfile.write('"name","email","age"\r\n')
+        for number in range(size):
+            csvfile.write(f'"User {number}","user{number}@example.com",'
+                          f'"{rng.randint(18, 100)}"\r\n')
+
+
+def seed_database(size):
+    """
+    Create and fill ALX_bench_<size> unless it already holds size rows.
+    """
+    os.environ['ALX_DB_NAME'] = bench_database(size)
+    seed.close_pool()
+
+    connection = seed.connect_db()
+    seed.create_database(connection)
+    connection.close()
+
+    connection = seed.connect_to_prodev()
+    seed.create_table(connection)
+    cursor = connection.cursor()
+    cursor.execute("SELECT COUNT(*) FROM user_data")
+    (existing,) = cursor.fetchone()
+    cursor.close()
+    connection.close()
+    if existing == size:
+        return
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        csv_path = os.path.join(tmpdir, 'users.csv')
+        write_synthetic_csv(csv_path, size)
+        seed.load_data_infile(csv_path)
+
+
+def _measure_worker(database, module_name, function_name, kwargs, batched):
+    """
+    Drain one generator and return its timings and peak RSS.
+    Runs in a fresh child process.
+    """
+    os.environ['ALX_DB_NAME'] = database
+    generator = getattr(__import__(module_name), function_name)
+    baseline_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    rows = 0
+    first_row_seconds = None
+    start = time.perf_counter()
+    for item in generator(**kwargs):
+        if first_row_seconds is None:
+            first_row_seconds = time.perf_counter() - start
+        rows += len(item) if batched else 1
+    seconds = time.perf_counter() - start
+
+    return {
+        'rows': rows,
+        'seconds': seconds,
+        'rows_per_second': rows / seconds if seconds > 0 else None,
+        'time_to_first_row': first_row_seconds,
+        'baseline_rss_kb': baseline_rss_kb,
+        'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+
+
+def measure(database, strategy, sweep_value=None):
+    """
+    Run one strategy against database in a spawned child process.
+    """
+    module_name, function_name, sweep_param, fixed, batched = \
+        STRATEGIES[strategy]
+    kwargs = dict(fixed)
+    if sweep_param is not None:
+        kwargs[sweep_param] = sweep_value
+
+    context = multiprocessing.get_context('spawn')
+    with context.Pool(processes=1, maxtasksperchild=1) as pool:
+        result = pool.apply(
+            _measure_worker,
+            (database, module_name, function_name, kwargs, batched)
+        )
+    result.update(strategy=strategy, parameters=kwargs)
+    return result
+
+
+def run_benchmarks(sizes=DEFAULT_SIZES, strategies=tuple(STRATEGIES),
+                   sweep=DEFAULT_SWEEP,
+                   offset_max_rows=DEFAULT_OFFSET_MAX_ROWS):
+    """
+    Seed every table size, run every strategy over the sweep and return
+    the results with enough environment detail to compare runs.
+    lazy_pagination_offset is skipped for tables above offset_max_rows
+    (None runs it at every size).
+    """
+    results = []
+    for size in sizes:
+        seed_database(size)
+        for strategy in strategies:
+            if (strategy == 'lazy_pagination_offset'
+                    and offset_max_rows is not None
+                    and size > offset_max_rows):
+                print(f"{size:>10} {strategy:<30} skipped "
+                      f"(table larger than {offset_max_rows} rows)")
+                continue
+            sweep_param = STRATEGIES[strategy][2]
+            for value in (sweep if sweep_param else (None,)):
+                result = measure(bench_database(size), strategy, value)
+                result['table_rows'] = size
+                results.append(result)
+                print(f"{size:>10} {strategy:<30} {value or '-':>7} "
+                      f"{result['rows_per_second'] or 0:>12.0f} rows/s "
+                      f"ttfr {result['time_to_first_row'] or 0:.4f}s "
+                      f"peak {result['peak_rss_kb']} kB")
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'random_seed': RANDOM_SEED,
+        'offset_max_rows': offset_max_rows,
+        'results': results,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=list(DEFAULT_SIZES))
+    parser.add_argument('--strategies', nargs='+', choices=list(STRATEGIES),
+                        default=list(STRATEGIES))
+    parser.add_argument('--sweep', type=int, nargs='+',
+                        default=list(DEFAULT_SWEEP),
+                        help="batch, page and prefetch sizes to try")
+    parser.add_argument('--offset-max-rows', type=int,
+                        default=DEFAULT_OFFSET_MAX_ROWS,
+                        help="skip OFFSET pagination above this table size "
+                             "(0 for no limit)")
+    parser.add_argument('--output', default='benchmark_results.json')
+    args = parser.parse_args()
+
+    report = run_benchmarks(args.sizes, args.strategies, args.sweep,
+                            args.offset_max_rows or None)
+    with open(args.output, 'w') as output:
+        json.dump(report, output, indent=2)
+    print(f"Wrote {len(report['results'])} results to {args.output}")
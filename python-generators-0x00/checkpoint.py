@@ -0,0 +1,118 @@
+#!/usr/bin/python3
+"""
+Persisted checkpoints for resumable streaming jobs over user_data.
+
+A checkpoint records the last user_id a job has fully processed and how
+many batches it has done. Streaming generators save it every few batches
+and, when handed the same checkpoint again, resume right after that key.
+"""
+import json
+import os
+
+seed = __import__('seed')
+
+
+class FileCheckpoint:
+    """
+    Checkpoint stored as a small JSON file.
+    Writes go to a temporary file that is renamed over the old one, so a
+    crash mid-write never leaves a torn checkpoint behind.
+    """
+    def __init__(self, path):
+        self.path = path
+
+    def load(self):
+        """
+        Return (last_key, batch_number), or (None, 0) if nothing is saved.
+        """
+        try:
+            with open(self.path) as checkpoint_file:
+                state = json.load(checkpoint_file)
+        except FileNotFoundError:
+            return None, 0
+        return state['last_key'], state['batch_number']
+
+    def save(self, last_key, batch_number):
+        """
+        Persist the position reached by the job.
+        """
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, 'w') as checkpoint_file:
+            json.dump({'last_key': last_key, 'batch_number': batch_number},
+                      checkpoint_file)
+            checkpoint_file.flush()
+            os.fsync(checkpoint_file.fileno())
+        os.replace(temp_path, self.path)
+
+    def clear(self):
+        """
+        Forget the saved position so the next run starts from the beginning.
+        """
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+class TableCheckpoint:
+    """
+    Checkpoint stored as a row of the stream_checkpoints table, keyed by
+    job name, so any host that can reach the database can resume the job.
+    """
+    def __init__(self, job_name):
+        self.job_name = job_name
+        self._execute(
+            """
+            CREATE TABLE IF NOT EXISTS stream_checkpoints (
+                job VARCHAR(255) PRIMARY KEY,
+                last_key CHAR(36) NULL,
+                batch_number INT NOT NULL,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    ON UPDATE CURRENT_TIMESTAMP
+            )
+            """
+        )
+
+    def _execute(self, query, params=(), fetch=False):
+        connection = seed.get_connection()
+        cursor = connection.cursor()
+        try:
+            cursor.execute(query, params)
+            row = cursor.fetchone() if fetch else None
+            connection.commit()
+            return row
+        finally:
+            cursor.close()
+            connection.close()
+
+    def load(self):
+        """
+        Return (last_key, batch_number), or (None, 0) if nothing is saved.
+        """
+        row = self._execute(
+            "SELECT last_key, batch_number FROM stream_checkpoints "
+            "WHERE job = ?",
+            (self.job_name,),
+            fetch=True
+        )
+        if row is None:
+            return None, 0
+        return row[0], row[1]
+
+    def save(self, last_key, batch_number):
+        """
+        Persist the position reached by the job.
+        """
+        self._execute(
+            "INSERT INTO stream_checkpoints (job, last_key, batch_number) "
+            "VALUES (?, ?, ?) ON DUPLICATE KEY UPDATE "
+            "last_key = VALUES(last_key), batch_number = VALUES(batch_number)",
+            (self.job_name, last_key, batch_number)
+        )
+
+    def clear(self):
+        """
+        Forget the saved position so the next run starts from the beginning.
+        """
+        self._execute("DELETE FROM stream_checkpoints WHERE job = ?",
+                      (self.job_name,))
@@ -0,0 +1,109 @@
+#!/usr/bin/python3
+"""
+Composable row filters for the user_data streaming generators.
+
+Build a filter from column references and combine filters with &, | and ~:
+
+    where = (col('age') > 25) & col('email').like('%@gmail.com')
+    sql, params = where.compile()   # "(age > ?) AND (email LIKE ?)", [25, ...]
+
+Generators compile the filter into a parameterised WHERE clause, so only
+matching rows ever leave the database.
+"""
+
+# Only real user_data columns can be referenced; values are always bound
+USER_DATA_COLUMNS = ('user_id', 'name', 'email', 'age')
+
+
+class Predicate:
+    """
+    A SQL boolean expression with its bound parameters.
+    """
+    def __init__(self, sql, params=()):
+        self.sql = sql
+        self.params = list(params)
+
+    def __and__(self, other):
+        return Predicate(f"({self.sql}) AND ({other.sql})",
+                         self.params + other.params)
+
+    def __or__(self, other):
+        return Predicate(f"({self.sql}) OR ({other.sql})",
+                         self.params + other.params)
+
+    def __invert__(self):
+        return Predicate(f"NOT ({self.sql})", self.params)
+
+    def compile(self):
+        """
+        Return (sql, params) ready to append after WHERE.
+        """
+        return self.sql, list(self.params)
+
+    def __repr__(self):
+        return f"Predicate({self.sql!r}, {self.params!r})"
+
+
+class Column:
+    """
+    Reference to a user_data column used to build predicates.
+    """
+    def __init__(self, name):
+        if name not in USER_DATA_COLUMNS:
+            raise ValueError(f"Unknown user_data column: {name!r}")
+        self.name = name
+
+    def _compare(self, operator, value):
+        return Predicate(f"{self.name} {operator} ?", [value])
+
+    def __eq__(self, value):
+        return self._compare('=', value)
+
+    def __ne__(self, value):
+        return self._compare('<>', value)
+
+    def __lt__(self, value):
+        return self._compare('<', value)
+
+    def __le__(self, value):
+        return self._compare('<=', value)
+
+    def __gt__(self, value):
+        return self._compare('>', value)
+
+    def __ge__(self, value):
+        return self._compare('>=', value)
+
+    __hash__ = None
+
+    def between(self, low, high):
+        return Predicate(f"{self.name} BETWEEN ? AND ?", [low, high])
+
+    def isin(self, values):
+        values = list(values)
+        if not values:
+            # An empty IN list matches nothing
+            return Predicate("1 = 0")
+        placeholders = ", ".join("?" for _ in values)
+        return Predicate(f"{self.name} IN ({placeholders})", values)
+
+    def like(self, pattern):
+        return self._compare('LIKE', pattern)
+
+
+def col(name):
+    """
+    Shorthand for Column(name).
+    """
+    return Column(name)
+
+
+def where_clause(predicate):
+    """
+    Compile an optional predicate into (" WHERE ...", params).
+    Returns ("", []) when predicate is None.
+    """
+    if predicate is None:
+        return "", []
+    sql, params = predicate.compile()
+    return f" WHERE {sql}", params
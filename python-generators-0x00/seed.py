@@ -3,17 +3,109 @@
 
 import mariadb
 import csv
+import io
+import mmap
+import os
+import threading
+import time
 import uuid
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from mariadb.constants import CURSOR
+
+# Columns of the user_data table, in table order
+USER_COLUMNS = ('user_id', 'name', 'email', 'age')
+
+# Define UserRow, a Compact Row Type for Streamed Users
+
+class UserRow:
+    """
+    Memory-light user_data row built from a cursor tuple.
+    Uses __slots__ instead of a per-row dict, while keeping dict-style
+    access (row['age'], row.get('email'), keys(), items()) working for code
+    written against dictionary cursors. Attribute access (row.age) works too.
+    """
+    __slots__ = USER_COLUMNS
+
+    def __init__(self, user_id, name, email, age):
+        self.user_id = user_id
+        self.name = name
+        self.email = email
+        self.age = age
+
+    def __getitem__(self, key):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __contains__(self, key):
+        return key in self.__slots__
+
+    def __iter__(self):
+        return iter(self.__slots__)
+
+    def __len__(self):
+        return len(self.__slots__)
+
+    def __eq__(self, other):
+        if isinstance(other, (UserRow, dict)):
+            return dict(self.items()) == dict(other.items())
+        return NotImplemented
+
+    __hash__ = None
+
+    def get(self, key, default=None):
+        return getattr(self, key) if key in self.__slots__ else default
+
+    def keys(self):
+        return self.__slots__
+
+    def values(self):
+        return tuple(getattr(self, key) for key in self.__slots__)
+
+    def items(self):
+        return tuple((key, getattr(self, key)) for key in self.__slots__)
+
+    def __repr__(self):
+        fields = ", ".join(f"{key}={getattr(self, key)!r}"
+                           for key in self.__slots__)
+        return f"UserRow({fields})"
+
+
+def user_rows(rows):
+    """
+    Convert (user_id, name, email, age) cursor tuples into UserRow objects.
+    """
+    return [UserRow(*row) for row in rows]
+
+# Define db_config() to Read Connection Settings from the Environment
+
+def db_config(with_database=True):
+    """
+    Build MariaDB connection arguments from ALX_DB_* environment variables,
+    falling back to the local development defaults.
+    """
+    config = {
+        'host': os.environ.get('ALX_DB_HOST', 'localhost'),
+        'port': int(os.environ.get('ALX_DB_PORT', '3306')),
+        'user': os.environ.get('ALX_DB_USER', 'root'),
+        'password': os.environ.get('ALX_DB_PASSWORD', '1395'),
+    }
+    if with_database:
+        config['database'] = database_name()
+    return config
+
+
+def database_name():
+    """
+    Name of the database holding user_data (ALX_DB_NAME, default ALX_prodev).
+    """
+    return os.environ.get('ALX_DB_NAME', 'ALX_prodev')
 
 # Define connect_db() to Connect to MariaDB Server (without specifying a database)
 
 def connect_db():
     try:
-        connection = mariadb.connect(
-            host='localhost',
-            user='root',
-            password='1395'
-        )
+        connection = mariadb.connect(**db_config(with_database=False))
         return connection
     except mariadb.Error as err:
         print(f"Error: {err}")
@@ -23,25 +115,136 @@ def connect_db():
 
 def create_database(connection):
     cursor = connection.cursor()
-    cursor.execute("CREATE DATABASE IF NOT EXISTS ALX_prodev")
+    cursor.execute(f"CREATE DATABASE IF NOT EXISTS `{database_name()}`")
     cursor.close()
 
 
+# Define the Shared Connection Pool for the ALX_prodev Database
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+class PoolExhausted(Exception):
+    """
+    Raised when no pooled connection became free in time.
+    Deliberately not a mariadb.Error, so the generators' database error
+    handling does not turn a saturated pool into an empty result.
+    """
+
+
+def configure_pool(size=None, validation_interval_ms=None):
+    """
+    (Re)create the process-wide connection pool.
+    size defaults to ALX_DB_POOL_SIZE (5) and validation_interval_ms, the
+    idle time after which a borrowed connection is pinged before use, to
+    ALX_DB_POOL_VALIDATION_MS (500). Connections are reset on return.
+    """
+    with _pool_lock:
+        return _configure_pool_locked(size, validation_interval_ms)
+
+
+def _configure_pool_locked(size=None, validation_interval_ms=None):
+    global _pool, _pool_pid
+    if size is None:
+        size = int(os.environ.get('ALX_DB_POOL_SIZE', '5'))
+    if validation_interval_ms is None:
+        validation_interval_ms = int(
+            os.environ.get('ALX_DB_POOL_VALIDATION_MS', '500')
+        )
+    if _pool is not None and _pool_pid == os.getpid():
+        _pool.close()
+    _pool = mariadb.ConnectionPool(
+        pool_name=f"alx_prodev_{os.getpid()}",
+        pool_size=size,
+        pool_reset_connection=True,
+        pool_validation_interval=validation_interval_ms,
+        **db_config()
+    )
+    _pool_pid = os.getpid()
+    return _pool
+
+
+def get_pool():
+    """
+    Return the process-wide pool, creating it on first use.
+    A pool inherited through fork is never reused by the child process.
+    """
+    pool = _pool
+    if pool is not None and _pool_pid == os.getpid():
+        return pool
+    with _pool_lock:
+        # Re-check: another thread may have built the pool while we waited
+        if _pool is None or _pool_pid != os.getpid():
+            return _configure_pool_locked()
+        return _pool
+
+
+def get_connection(timeout=10.0):
+    """
+    Borrow a connection from the shared pool, waiting up to timeout seconds
+    when every pooled connection is in use. Calling close() on the returned
+    connection hands it back to the pool. Raises PoolExhausted if none
+    became free in time.
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            connection = get_pool().get_connection()
+        except mariadb.PoolError:
+            connection = None
+        if connection is not None:
+            return connection
+        if time.monotonic() >= deadline:
+            raise PoolExhausted(
+                f"No pooled connection available after {timeout}s"
+            )
+        time.sleep(0.01)
+
+
+def close_pool():
+    """
+    Close every connection held by the shared pool.
+    """
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is not None and _pool_pid == os.getpid():
+            _pool.close()
+        _pool = None
+        _pool_pid = None
+
+
 # Define connect_to_prodev() to Connect to ALX_prodev Database
 
 def connect_to_prodev():
     try:
-        connection = mariadb.connect(
-            host='localhost',
-            user='root',
-            password='1395',
-            database='ALX_prodev'
-        )
-        return connection
+        return get_connection()
     except mariadb.Error as err:
         print(f"Error: {err}")
         return None
 
+# Define open_stream_cursor(connection) to Create a Cursor for Streaming Reads
+
+def open_stream_cursor(connection, server_side=False, prefetch_size=100,
+                       dictionary=False):
+    """
+    Return a cursor suited to streaming a large result set.
+    By default the connector's buffered cursor is used, which pulls the whole
+    result into client memory on execute. With server_side=True a read-only
+    server-side cursor is opened instead and rows are fetched prefetch_size
+    at a time, so client memory stays flat however large the table is.
+    """
+    if server_side:
+        if prefetch_size < 1:
+            raise ValueError("prefetch_size must be at least 1")
+        return connection.cursor(
+            dictionary=dictionary,
+            cursor_type=CURSOR.READ_ONLY,
+            prefetch_size=prefetch_size
+        )
+    return connection.cursor(dictionary=dictionary)
+
 # Define create_table(connection) to Create user_data Table
 
 def create_table(connection):
@@ -56,6 +259,12 @@ def create_table(connection):
     )
     """
     cursor.execute(create_table_query)
+    # Unique email index lets bulk loads skip duplicates without a probe query
+    cursor.execute(
+        "CREATE UNIQUE INDEX IF NOT EXISTS uq_email ON user_data (email)"
+    )
+    # Age index lets pushed-down age filters avoid a full table scan
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_age ON user_data (age)")
     connection.commit()
     cursor.close()
     print("Table user_data created successfully")
@@ -85,3 +294,217 @@ def insert_data(connection, csv_file_path):
             cursor.execute(insert_query, (user_id, name, email, age))
     connection.commit()
     cursor.close()
+
+
+# Define bulk_insert_data(connection, csv_file_path) to Bulk Load Data from CSV
+
+BULK_INSERT_QUERY = """
+INSERT INTO user_data (user_id, name, email, age)
+VALUES (?, ?, ?, ?)
+ON DUPLICATE KEY UPDATE email = email
+"""
+
+
+def read_csv_chunks(csv_file_path, chunk_size=1000):
+    """
+    Stream the CSV file and yield lists of at most chunk_size row tuples
+    ready for executemany. A fresh user_id is generated for every row.
+    """
+    with open(csv_file_path, newline='') as csvfile:
+        reader = csv.DictReader(csvfile)
+        chunk = []
+        for row in reader:
+            chunk.append(
+                (str(uuid.uuid4()), row['name'], row['email'], row['age'])
+            )
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+
+def bulk_insert_data(connection, csv_file_path, chunk_size=1000,
+                     commit_every=10):
+    """
+    Bulk load users from a CSV file with one executemany round trip per
+    chunk. Duplicate emails are skipped by the uq_email unique index, so
+    the load is idempotent and can simply be re-run after a failure.
+    Commits every commit_every chunks and reports throughput.
+    Returns the number of CSV rows processed.
+    """
+    cursor = connection.cursor()
+    total = 0
+    start = time.perf_counter()
+    try:
+        for chunk_number, chunk in enumerate(
+                read_csv_chunks(csv_file_path, chunk_size), start=1):
+            cursor.executemany(BULK_INSERT_QUERY, chunk)
+            total += len(chunk)
+            if chunk_number % commit_every == 0:
+                connection.commit()
+                elapsed = time.perf_counter() - start
+                print(f"Loaded {total} rows ({total / elapsed:.0f} rows/s)")
+        connection.commit()
+    except mariadb.Error as err:
+        print(f"Error: {err} (rows up to the last commit are kept)")
+        raise
+    finally:
+        cursor.close()
+
+    elapsed = time.perf_counter() - start
+    rate = total / elapsed if elapsed > 0 else float(total)
+    print(f"Bulk load finished: {total} rows in {elapsed:.2f}s "
+          f"({rate:.0f} rows/s)")
+    return total
+
+
+# Define parallel_insert_data(csv_file_path) to Parse and Load the CSV in Parallel
+
+def csv_byte_ranges(csv_file_path, chunk_bytes=16 * 1024 * 1024):
+    """
+    Split the CSV file (minus its header line) into (start, end) byte ranges
+    of roughly chunk_bytes, each ending on a line boundary.
+    Returns (columns, ranges), where columns are the header's column names.
+    Assumes no quoted field contains a line break, which holds for
+    user_data exports.
+    """
+    with open(csv_file_path, 'rb') as csvfile:
+        if os.fstat(csvfile.fileno()).st_size == 0:
+            return [], []
+        with mmap.mmap(csvfile.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            size = len(data)
+            start = data.find(b'\n') + 1 or size
+            header = data[:start].decode('utf-8-sig')
+            columns = next(csv.reader([header]), [])
+            ranges = []
+            while start < size:
+                end = data.find(b'\n', min(start + chunk_bytes, size) - 1)
+                end = size if end == -1 else end + 1
+                ranges.append((start, end))
+                start = end
+            return columns, ranges
+
+
+def parse_csv_range(csv_file_path, start, end, columns):
+    """
+    Parse the CSV lines in one byte range into insert-ready
+    (user_id, name, email, age) tuples, picking fields by their position
+    in columns, the header from csv_byte_ranges. Blank lines are skipped.
+    """
+    try:
+        positions = [columns.index(name) for name in ('name', 'email', 'age')]
+    except ValueError:
+        raise ValueError(
+            f"CSV header must contain name, email and age: {columns}"
+        ) from None
+    with open(csv_file_path, 'rb') as csvfile:
+        with mmap.mmap(csvfile.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            chunk = data[start:end]
+    reader = csv.reader(
+        io.TextIOWrapper(io.BytesIO(chunk), encoding='utf-8', newline='')
+    )
+    rows = []
+    for row in reader:
+        if not any(field.strip() for field in row):
+            continue
+        if len(row) < len(columns):
+            raise ValueError(
+                f"{csv_file_path}: line {reader.line_num} of the range "
+                f"starting at byte {start} has {len(row)} fields, expected "
+                f"{len(columns)}: {row!r}"
+            )
+        rows.append(
+            (str(uuid.uuid4()),) + tuple(row[position] for position in positions)
+        )
+    return rows
+
+
+def load_csv_range(csv_file_path, start, end, columns, batch_size=1000):
+    """
+    Worker: parse one byte range and insert it on a pooled connection with
+    batched, idempotent inserts. Returns the number of rows processed.
+    """
+    rows = parse_csv_range(csv_file_path, start, end, columns)
+    connection = get_connection()
+    cursor = connection.cursor()
+    try:
+        for offset in range(0, len(rows), batch_size):
+            cursor.executemany(BULK_INSERT_QUERY,
+                               rows[offset:offset + batch_size])
+        connection.commit()
+    finally:
+        cursor.close()
+        connection.close()
+    return len(rows)
+
+
+def parallel_insert_data(csv_file_path, workers=None,
+                         chunk_bytes=16 * 1024 * 1024, batch_size=1000):
+    """
+    Load a large CSV by splitting it into line-aligned byte ranges that are
+    parsed and inserted by a pool of worker processes, each on its own
+    connection. Every range is committed on its own, and duplicate emails
+    are skipped, so a failed load can simply be re-run.
+    Returns the number of CSV rows processed.
+    """
+    columns, ranges = csv_byte_ranges(csv_file_path, chunk_bytes)
+    total = 0
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(load_csv_range, csv_file_path, low, high,
+                            columns, batch_size)
+            for low, high in ranges
+        ]
+        for future in as_completed(futures):
+            total += future.result()
+            elapsed = time.perf_counter() - start
+            print(f"Loaded {total} rows ({total / elapsed:.0f} rows/s)")
+    return total
+
+
+# Define load_data_infile(csv_file_path) to Load the CSV with LOAD DATA
+
+def load_data_infile(csv_file_path):
+    """
+    Load the CSV with LOAD DATA LOCAL INFILE so the server does the parsing.
+    Columns are mapped by the CSV header, like the other loaders; columns
+    other than name, email and age are read into @dummy and dropped.
+    A UUID is generated per row and duplicate emails are ignored.
+    Needs local_infile enabled on the server. Returns the number of rows
+    inserted.
+    """
+    with open(csv_file_path, 'rb') as csvfile:
+        header = csvfile.readline()
+    line_terminator = '\\r\\n' if header.endswith(b'\r\n') else '\\n'
+    columns = next(csv.reader([header.decode('utf-8-sig')]), [])
+    if not {'name', 'email', 'age'} <= set(columns):
+        raise ValueError(
+            f"CSV header must contain name, email and age: {columns}"
+        )
+    column_list = ", ".join(
+        column if column in ('name', 'email', 'age') else '@dummy'
+        for column in columns
+    )
+    # LOAD DATA cannot be prepared, so the path is inlined as an escaped literal
+    path_literal = (os.path.abspath(csv_file_path)
+                    .replace('\\', '\\\\').replace("'", "\\'"))
+
+    connection = mariadb.connect(local_infile=True, **db_config())
+    cursor = connection.cursor()
+    try:
+        cursor.execute(
+            f"LOAD DATA LOCAL INFILE '{path_literal}' "
+            "IGNORE INTO TABLE user_data "
+            "FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '\"' "
+            f"LINES TERMINATED BY '{line_terminator}' IGNORE 1 LINES "
+            f"({column_list}) SET user_id = UUID()"
+        )
+        inserted = cursor.rowcount
+        connection.commit()
+    finally:
+        cursor.close()
+        connection.close()
+    print(f"LOAD DATA inserted {inserted} rows")
+    return inserted